@@ -1,61 +1,377 @@
 """CLI wrapper for the sudokusat application."""
 
 import argparse
+import glob
 import os
 import pathlib
-from algorithm import Solver, verify_sat
-from heuristics import random_split, moms_split, jeroslow_wang_split
-from sudoku_verifier import is_valid, build_grid
-from io_tools import read_dimacs, write_dimacs
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from algorithm import verify_sat
+from engines import make_solver
+from heuristics import SPLIT_HEURISTICS
+from io_tools import read_dimacs, write_dimacs, parse_dimacs, split_dimacs_stream
 from loguru import logger
 import sys
 
 
+# The selector used by -S0, loaded once per process
+_SELECTOR = None
+
+# The result cache of --result-cache, opened once per process
+_RESULT_CACHE = None
+
+
+def expand_inputs(patterns, manifest=None):
+    """Expand the input arguments to a list of DIMACS file paths.
+
+    Parameters
+    ----------
+    patterns : List[str]
+        File paths or glob patterns. `-` (stdin) is kept as is.
+    manifest : str, optional
+        A file with one path (or glob pattern) per line.
+
+    Returns
+    -------
+    List[str]
+        The paths, in the order given.
+    """
+
+    patterns = list(patterns)
+    if manifest is not None:
+        with open(manifest, 'r') as infile:
+            patterns += [l.strip() for l in infile
+                         if l.strip() and not l.startswith('#')]
+
+    paths = []
+    for pattern in patterns:
+        if pattern == '-' or not glob.has_magic(pattern):
+            paths.append(pattern)
+        else:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                logger.warning(f"No files match '{pattern}'")
+            paths.extend(matches)
+    return paths
+
+
+def build_solver(sigma, heuristic, args):
+    """Build the solver for the `--engine` chosen on the command line."""
+
+    kwargs = dict(split_heuristic=heuristic,
+                  backtrack_thresh=args.b,
+                  probe_budget=args.p,
+                  binary_graph=args.binary,
+                  native_amo=args.amo,
+                  components=args.components)
+    return make_solver(sigma, engine=args.engine, max_flips=args.flips,
+                       noise=args.noise, restarts=args.restarts,
+                       seed_phases=args.phases, **kwargs)
+
+
+def open_result_cache(args):
+    """Returns the `--result-cache` of this process, or `None`."""
+
+    global _RESULT_CACHE
+
+    if args.result_cache is None:
+        return None
+    if _RESULT_CACHE is None:
+        from cache import ResultCache
+        _RESULT_CACHE = ResultCache(args.result_cache)
+    return _RESULT_CACHE
+
+
+def build_cached_solver(sigma, heuristic, args):
+    """Build the solver, answering from the `--result-cache` if given."""
+
+    result_cache = open_result_cache(args)
+    if result_cache is None:
+        return build_solver(sigma, heuristic, args)
+
+    from cache import CachedSolver
+    config = (f'{args.engine} -b {args.b} -p {args.p} --binary {args.binary} '
+              f'--amo {args.amo} --components {args.components}')
+    return CachedSolver(result_cache, sigma,
+                        lambda: build_solver(sigma, heuristic, args),
+                        sudoku=args.sudoku, config=config)
+
+
+def solve_instance(name, sigma, args):
+    """Solve one instance of a batch, returning its result line fields.
+
+    Parameters
+    ----------
+    name : str
+        The name of the instance, printed with the result.
+    sigma : List[List]
+        The instance, or `None` to read it from the file `name`.
+    args : argparse.Namespace
+        The parsed command line options.
+
+    Returns
+    -------
+    dict
+        The name, conclusion, solving time and search statistics, and
+        the assignment when `-o` is given.
+    """
+
+    global _SELECTOR
+
+    start_time = time.time()
+    if sigma is None:
+        sigma = read_dimacs(name)
+
+    if args.S == 0:
+        from selector import load_selector, select_heuristic
+        if _SELECTOR is None:
+            _SELECTOR = load_selector(args.selector) or False
+        heuristic, _ = select_heuristic(sigma, _SELECTOR or None)
+    else:
+        heuristic = SPLIT_HEURISTICS[args.S - 1]
+    solver = build_cached_solver(sigma, heuristic, args)
+    if args.m is None:
+        res = solver.solve()
+    else:
+        solver.enumerate(max_models=args.m)
+        res = solver.model_count > 0
+    var = solver.variables
+    perf = solver.performance
+
+    conclusion = perf['conclusion']
+    if res and not solver.timedout and not verify_sat(sigma, var):
+        conclusion = 'CONFLICT'
+
+    return {
+        'name': name,
+        'conclusion': conclusion,
+        'time': time.time() - start_time,
+        'heuristic': perf['heuristic'],
+        'splits': perf.get('splits', '-'),
+        'backtracks': perf.get('backtracks', '-'),
+        'models': solver.model_count if args.m is not None else None,
+        'variables': var if args.o is not None else None,
+    }
+
+
+def _init_worker(log_level):
+    """Configure logging in a batch worker process."""
+
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+
+
+def run_batch(paths, args):
+    """Solve many instances, printing one result line as each finishes.
+
+    Parameters
+    ----------
+    paths : List[str]
+        The DIMACS files to solve, where `-` reads a stream of DIMACS
+        files (split on their `p cnf` headers) from stdin.
+    args : argparse.Namespace
+        The parsed command line options.
+
+    Returns
+    -------
+    int
+        The number of instances that failed (errors or conflicts).
+    """
+
+    stems = {}
+
+    def out_name(name):
+        # Same-named inputs from different directories get a suffix
+        stem = pathlib.Path(name.replace(':', '_')).stem
+        stems[stem] = stems.get(stem, 0) + 1
+        if stems[stem] > 1:
+            stem = f'{stem}_{stems[stem]}'
+        return os.path.join(args.o, f'{stem}.out')
+
+    def instances():
+        for path in paths:
+            if path == '-':
+                for i, lines in enumerate(split_dimacs_stream(sys.stdin)):
+                    yield f'<stdin>:{i}', parse_dimacs(lines)
+            else:
+                yield path, None
+
+    if args.o is not None:
+        os.makedirs(args.o, exist_ok=True)
+
+    failures = 0
+
+    def report(name, result=None, error=None, outfile=None):
+        nonlocal failures
+        if error is not None:
+            failures += 1
+            print(f'{name}\tERROR\t{error}', flush=True)
+            return
+        if result['conclusion'] == 'CONFLICT':
+            failures += 1
+        fields = [result['name'], result['conclusion'],
+                  f"{result['time']:.3f}", result['heuristic'],
+                  result['splits'], result['backtracks']]
+        if result['models'] is not None:
+            fields.append(result['models'])
+        print('\t'.join(str(f) for f in fields), flush=True)
+        if result['variables'] is not None:
+            write_dimacs(outfile, result['variables'])
+
+    if args.j is None or args.j <= 1:
+        for name, sigma in instances():
+            outfile = out_name(name) if args.o is not None else None
+            try:
+                report(name, solve_instance(name, sigma, args), outfile=outfile)
+            except Exception as e:
+                report(name, error=e)
+        return failures
+
+    # Only a few instances are in flight at once, and each is reported
+    # as it finishes, so a stream is answered as it is read
+    lock = threading.Lock()
+    slots = threading.Semaphore(2 * args.j)
+
+    def finish(job, name, outfile):
+        with lock:
+            try:
+                report(name, job.result(), outfile=outfile)
+            except Exception as e:
+                report(name, error=e)
+        slots.release()
+
+    with ProcessPoolExecutor(max_workers=args.j, initializer=_init_worker,
+                             initargs=(args.l,)) as pool:
+        for name, sigma in instances():
+            outfile = out_name(name) if args.o is not None else None
+            slots.acquire()
+            job = pool.submit(solve_instance, name, sigma, args)
+            job.add_done_callback(
+                lambda job, name=name, outfile=outfile:
+                    finish(job, name, outfile))
+    return failures
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='General purpose SAT solver for sukoku applications.')
-    parser.add_argument('input_file', help='The path of a DIMACS file to solve.',
-                        type=str)
+    parser.add_argument('input_files', nargs='*', type=str,
+                        help='The paths (or glob patterns) of DIMACS files to \
+                            solve. Use - to read a stream of DIMACS files \
+                            from stdin.')
+    parser.add_argument('--manifest', type=str, required=False,
+                        help='A file listing one DIMACS path per line to solve.')
+    parser.add_argument('-j', type=int, required=False,
+                        help='Solve this many instances in parallel in batch \
+                            mode. Default 1.')
     parser.add_argument('-o', type=str, required=False,
-                        help='The path to write the DIMACS output to.')
+                        help='The path to write the DIMACS output to (a \
+                            directory in batch mode).')
     parser.add_argument('-S', type=int,
-                        required=False, choices=[1, 2, 3], default=1,
+                        required=False, choices=[0, 1, 2, 3, 4], default=1,
                         help='Specify which heuristic strategy to use. \
-                            (1) Random, (2) MOMs, (3) 2-sided JW. Default is 1.')
+                            (0) Automatic, (1) Random, (2) MOMs, \
+                            (3) 2-sided JW, (4) Lookahead. Default is 1.')
+    parser.add_argument('--selector', type=str, default='selector.json',
+                        help='The trained selector used by -S0. \
+                            Default selector.json.')
     parser.add_argument('-b', type=int, required=False, default=400,
                         help='Specify after how many backtracks the \
                             solver should timeout. Default 400.')
+    parser.add_argument('-p', type=int, required=False, default=0,
+                        help='Probe this many literals for failure at the \
+                            root of the search. Default 0 (no probing).')
+    parser.add_argument('--binary', default=False, action='store_true',
+                        help='Propagate binary clauses through an implication \
+                            graph instead of treating them as general clauses.')
+    parser.add_argument('--amo', default=False, action='store_true',
+                        help='Detect pairwise at-most-one encodings and use \
+                            native cardinality constraints for them.')
+    parser.add_argument('--components', default=False, action='store_true',
+                        help='Solve the independent parts of the expression \
+                            separately, caching solved parts.')
+    parser.add_argument('--engine', type=str, default='dpll',
+                        choices=['dpll', 'walksat', 'probsat', 'portfolio'],
+                        help='Solve with DPLL, with local search (which cannot \
+                            prove UNSAT), or with DPLL and probSAT in turns. \
+                            Default dpll.')
+    parser.add_argument('--flips', type=int, default=100000,
+                        help='Local search flips before each restart. \
+                            Default 100000.')
+    parser.add_argument('--restarts', type=int, default=10,
+                        help='Local search restarts before it should timeout. \
+                            Default 10.')
+    parser.add_argument('--noise', type=float, required=False,
+                        help='Local search noise: the walk probability of \
+                            WalkSAT or the break exponent of probSAT.')
+    parser.add_argument('--phases', default=False, action='store_true',
+                        help='Let DPLL first try the values of a local \
+                            search run.')
     parser.add_argument('--sudoku', default=False, action='store_true',
                         help='If the SAT problem is a sudoku, then print the solution in a grid format.')
+    parser.add_argument('--result-cache', type=str, required=False,
+                        help='A sqlite file of solved instances to answer \
+                            repeated instances from (with --sudoku, also \
+                            symmetric sudokus), created if missing.')
+    parser.add_argument('-m', type=int, required=False,
+                        help='Enumerate up to this many models instead of \
+                            stopping at the first. Use 2 to check uniqueness.')
     parser.add_argument('-l', type=str, required=False, choices=[
                         'DEBUG', 'INFO', 'WARNING'], default='WARNING', help='The log level to use for stdout.')
 
     # Parse the CL arguments into a Namespace
     args = parser.parse_args()
-    # Verify that file exists
-    infile = pathlib.Path(args.input_file)
-    if not os.path.exists(infile):
-        raise FileExistsError(f"Could not locate '{infile}'")
+    # Configure logging to stderr
+    logger.remove()
+    logger.add(sys.stderr, level=args.l)
 
-    # Assign the corresponding splitting heuristic
-    heuristic = [random_split, moms_split,
-                 jeroslow_wang_split][args.S - 1]
-    print(f'Using {heuristic.__name__} heuristic')
+    paths = expand_inputs(args.input_files, args.manifest)
+    if not paths:
+        parser.error('No input files given')
+
+    # Verify that files exist
+    for path in paths:
+        if path != '-' and not os.path.exists(path):
+            raise FileExistsError(f"Could not locate '{path}'")
 
     # Verify that backtrack threshold is viable
     if not 5 < args.b < 10000:
         raise ValueError(f'Backtrack threshold should be between 5 and 10000')
 
-    # Configure logging to stderr
-    logger.remove()
-    logger.add(sys.stderr, level=args.l)
+    if args.m is not None and args.engine != 'dpll':
+        parser.error('Models can only be enumerated with the dpll engine')
+    if args.m is not None and args.result_cache is not None:
+        parser.error('Models cannot be enumerated with the result cache')
+
+    # Several instances are solved in batch mode, one result line each
+    if len(paths) > 1 or paths[0] == '-' or args.manifest is not None:
+        sys.exit(1 if run_batch(paths, args) else 0)
+    infile = pathlib.Path(paths[0])
 
     # Read the data files and run solver
     sigma = read_dimacs(infile)
-    solver = Solver(sigma,
-                    split_heuristic=heuristic,
-                    backtrack_thresh=args.b)
-    res = solver.solve()
+
+    # Assign the corresponding splitting heuristic
+    if args.S == 0:
+        from selector import load_selector, select_heuristic
+        heuristic, selection_time = select_heuristic(
+            sigma, load_selector(args.selector))
+        print(f'Using {heuristic.__name__} heuristic '
+              f'(selected in {selection_time * 1000:.1f} ms)')
+    else:
+        heuristic = SPLIT_HEURISTICS[args.S - 1]
+        print(f'Using {heuristic.__name__} heuristic')
+    if args.engine != 'dpll':
+        print(f'Using {args.engine} engine')
+    solver = build_cached_solver(sigma, heuristic, args)
+    if args.result_cache is not None and solver.hit:
+        print(f'Found in the result cache {args.result_cache}')
+    if args.m is None:
+        res = solver.solve()
+    else:
+        solver.enumerate(max_models=args.m)
+        res = solver.model_count > 0
     var = solver.variables
 
     if solver.timedout:
@@ -63,9 +379,12 @@ if __name__ == '__main__':
     else:
         if res:
             print('Satisfiable')
+            if args.m is not None:
+                print(f'Models found: {solver.model_count}')
             if not verify_sat(sigma, var):
                 print("CONFLICT!")
             if args.sudoku:
+                from sudoku_verifier import build_grid
                 grid = build_grid(var)
                 print(grid)
         else:
@@ -1,21 +1,39 @@
 """Implementation of DPLL algorithm"""
 
-from simplifications import tautology, unit_clause, pure_literals
+from simplifications import tautology, unit_clause, pure_literals, \
+    assign_values, failed_literals
 from heuristics import random_split
-from copy import deepcopy as dcopy
+from implications import ImplicationGraph
+from cardinality import detect_amo, AtMostOne
+from components import connected_components, component_key
 from loguru import logger
 from abc import ABC
-from typing import List, Tuple
+from typing import Generator, List, Tuple
 
 
 class Solver(ABC):
     """General-purpose Satisfiability solver.
+
+    Examples
+    --------
+    An at-most-one constraint over 2, 3, 4 and 5, where 2 and 3 as well
+    as 4 and 5 turn out to be complementary, is unsatisfiable:
+
+    >>> amo = [[-a, -b] for a in range(2, 6) for b in range(a + 1, 6)]
+    >>> sigma = amo + [[2, 3], [-3, 6], [-6, -2], [4, 5], [-5, 7], [-7, -4]]
+    >>> Solver(sigma, binary_graph=True, native_amo=True).solve()
+    False
     """
 
     def __init__(self,
                  sigma: List[List[int]],
                  split_heuristic=random_split,
-                 backtrack_thresh=400):
+                 backtrack_thresh=400,
+                 probe_budget=0,
+                 probe_interval=0,
+                 binary_graph=False,
+                 native_amo=False,
+                 components=False):
         """Constructor for `Solver` class
 
 
@@ -31,20 +49,61 @@ class Solver(ABC):
         backtrack_thresh : int, optional
             The number of backtracks after which the solver should timeout,
             by default 400
+        probe_budget : int, optional
+            The number of literals to probe for failure (see
+            `failed_literals`) at the root, by default 0 (no probing)
+        probe_interval : int, optional
+            Also probe every this many DPLL calls, by default 0 (root only)
+        binary_graph : bool, optional
+            Keep the binary clauses in an `ImplicationGraph` and propagate
+            them separately from the other clauses, by default False
+        native_amo : bool, optional
+            Replace pairwise at-most-one encodings by native `AtMostOne`
+            constraints (see `detect_amo`), by default False
+        components : bool, optional
+            Solve the parts of the expression that share no variables
+            separately, caching the result of each part, by default False.
+            Cannot be combined with `binary_graph` or `native_amo`.
         """
 
-        self.__sigma = dcopy(sigma)
+        if components and (binary_graph or native_amo):
+            raise ValueError('Component decomposition cannot be combined '
+                             'with binary_graph or native_amo')
+
         self.sigma = sigma
         self.split_heuristic = split_heuristic
         self.backtrack_threshold = backtrack_thresh
+        self.probe_budget = probe_budget
+        self.probe_interval = probe_interval
+        self.components = components
         collapsed = list(set([abs(y) for x in sigma for y in x]))
         self.variables = {k: None for k in collapsed}
         self.__simplifications = 0
         self.__splits = 0
         self.__backtracks = 0
+        self.__model_backtracks = 0
         self.__dpll_calls = 0
+        self.__forced = 0
         self.__timedout = False
+        self.__cancelled = False
         self.__conclusion = None
+        self.__yield_every = 0
+        self.__enumerating = False
+        self.__max_models = None
+        self.__models = []
+        self.__model_count = 0
+        self.__graph = None
+        self.__amo = None
+        self.__propagators = []
+        self.__substituted = set()
+        self.__component_cache = {}
+        self.__decompositions = 0
+        self.__component_hits = 0
+        self.__working = sigma
+        if native_amo:
+            self.__build_amo()
+        if binary_graph:
+            self.__build_graph()
 
     def solve(self) -> bool:
         """Find whether the embedded PL expression is `SAT` or `UNSAT`
@@ -55,8 +114,52 @@ class Solver(ABC):
             `True` if satisfiable, else `False`.
             (Note: will also be `False` in case of timeout.)
         """
-        res, self.variables = self.__dpll(self.sigma, self.variables)
-        if res:
+        steps = self.steps(every=0)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def steps(self, every=100):
+        """Run the solver as a generator that pauses every few DPLL calls.
+
+        This allows the search to be interleaved with other work, such as
+        an event loop (see `async_solver.py`). The generator's return value
+        is the same as that of `solve()`.
+
+        Parameters
+        ----------
+        every : int, optional
+            The number of DPLL calls between pauses, by default 100.
+            A value of 0 never pauses.
+
+        Yields
+        ------
+        dict
+            The current `progress` of the solver.
+        """
+        self.__yield_every = every
+        sigma = self.__working
+        if not isinstance(sigma, list):
+            # A read-only clause base (e.g. `SharedClauses`) is streamed
+            # through the unit clauses, so only the clauses they leave
+            # open are copied into this solve
+            for clause in sigma:
+                if len(clause) == 1 and \
+                        self.variables[abs(clause[0])] is None:
+                    self.variables[abs(clause[0])] = clause[0] > 0
+            sigma = self.__assign_simplify(sigma, self.variables)
+        res, self.variables = yield from self.__dpll(sigma, self.variables)
+        if self.__graph is not None:
+            self.variables = self.__graph.expand(self.variables,
+                                                 complete=res)
+        if self.__enumerating and self.__models:
+            res = True
+            self.variables = dict(self.__models[0])
+        if self.__cancelled:
+            logger.warning('CANCELLED')
+        elif res:
             logger.warning('SAT')
             self.__conclusion = 'SAT'
         else:
@@ -64,16 +167,84 @@ class Solver(ABC):
             self.__conclusion = 'UNSAT'
         return res
 
+    def enumerate(self, max_models=None) -> List[dict]:
+        """Find the models of the embedded PL expression.
+
+        Instead of stopping at the first model, the search records it and
+        backtracks into the remaining branches. Pure literal elimination
+        is disabled, as it does not preserve all models.
+
+        Parameters
+        ----------
+        max_models : int, optional
+            Stop after this many models, by default None (find all).
+            Use 2 to check that a solution is unique.
+
+        Returns
+        -------
+        List[dict]
+            The variable values of each model found. A value of `None`
+            means the model holds for either value of that variable.
+            Variables found equivalent to others (with `binary_graph`)
+            always have a value; a model where they were free stands
+            for both values, as counted in `model_count`.
+        """
+        self.__enumerating = True
+        self.__max_models = max_models
+        self.solve()
+        return self.models
+
+    def cancel(self):
+        """Ask a running solver to stop at its next DPLL call.
+
+        The solver then concludes `CANCELLED` and `solve()` returns `False`.
+        This is safe to call from another thread.
+        """
+        self.__cancelled = True
+
     @property
     def performance(self) -> dict:
         """Returns performance statistics"""
-        return {
+        perf = {
             'heuristic': self.split_heuristic.__name__,
             'simplifications': self.__simplifications,
             'calls': self.__dpll_calls,
             'splits': self.__splits,
             'backtracks': self.__backtracks,
-            'conclusion': 'TIMEOUT' if self.__timedout else self.__conclusion,
+            'forced_literals': self.__forced,
+            'conclusion': 'CANCELLED' if self.__cancelled else (
+                'TIMEOUT' if self.__timedout else self.__conclusion),
+        }
+        if self.__enumerating:
+            perf['models'] = self.__model_count
+            perf['model_backtracks'] = self.__model_backtracks
+        if self.components:
+            perf['decompositions'] = self.__decompositions
+            perf['component_hits'] = self.__component_hits
+        return perf
+
+    @property
+    def models(self) -> List[dict]:
+        """Returns the models found by `enumerate()`"""
+        return self.__models
+
+    @property
+    def model_count(self) -> int:
+        """Returns the number of models found by `enumerate()`.
+
+        Models with unassigned variables count once for each value
+        those variables can take. After a timeout this is a lower bound.
+        """
+        return self.__model_count
+
+    @property
+    def progress(self) -> dict:
+        """Returns the progress of a running search"""
+        return {
+            'calls': self.__dpll_calls,
+            'splits': self.__splits,
+            'backtracks': self.__backtracks,
+            'unknowns': self.unknowns,
         }
 
     @property
@@ -87,6 +258,11 @@ class Solver(ABC):
         """
         return self.__timedout
 
+    @property
+    def cancelled(self) -> bool:
+        """Whether the solver was cancelled before reaching a conclusion."""
+        return self.__cancelled
+
     @property
     def unknowns(self) -> int:
         """Returns a count of the variables with unknown values.
@@ -99,15 +275,23 @@ class Solver(ABC):
 
         return len([v for v in self.variables.keys() if self.variables[v] is None])
 
-    def __dpll(self, sigma, variables) -> Tuple[bool, dict]:
+    def __dpll(self, sigma, variables) -> Generator[dict, None,
+                                                   Tuple[bool, dict]]:
         """Apply DPLL algorithm to some expression `sigma` and `variables`
 
+        This is a generator, which yields the solver `progress` every
+        `steps(every)` calls and returns the result when exhausted.
+
         Returns
         -------
         Tuple
             The satisfiability of the expression, the variable values.
         """
         self.__dpll_calls += 1
+        if self.__yield_every and self.__dpll_calls % self.__yield_every == 0:
+            yield self.progress
+        if self.__cancelled:
+            return False, variables
         if self.__backtracks > self.backtrack_threshold:
             if not self.__timedout:
                 logger.error(
@@ -122,6 +306,22 @@ class Solver(ABC):
         if len(sigma) < 1:
             logger.info('SAT', sigma)
             logger.info([x for x in variables.keys() if variables[x] == True])
+            if self.__propagators:
+                residual = []
+                if self.__amo is not None:
+                    residual = self.__amo.residual_clauses(variables)
+                if self.__graph is not None and (
+                        residual or self.__enumerating):
+                    residual += self.__graph.residual_clauses(variables)
+                if residual:
+                    # Branch on the constraints that are still open
+                    return (yield from self.__dpll(residual, variables))
+                if self.__graph is not None and not self.__enumerating and \
+                        not self.__graph.solve_residual(variables):
+                    logger.info('UNSAT (binary clauses)')
+                    return False, variables
+            if self.__enumerating:
+                return self.__record_model(variables), variables
             return True, variables
         # Return UNSAT if the expression contains empty clause
         elif [] in sigma:
@@ -134,6 +334,9 @@ class Solver(ABC):
             new_variables = variables
             new_sigma = tautology(new_sigma)
             new_sigma = self.__assign_simplify(new_sigma, new_variables)
+            if self.__propagators:
+                unassigned = [v for v in new_variables
+                              if new_variables[v] is None]
 
             # Keep simplifying as long as you can
             while self.__diff_shape(old_sigma, new_sigma) and (
@@ -142,24 +345,54 @@ class Solver(ABC):
 
                 self.__simplifications += 1
                 old_sigma = new_sigma
-                new_sigma, new_variables = pure_literals(
-                    new_sigma, new_variables)
+                if not self.__enumerating and not self.__propagators:
+                    new_sigma, new_variables = pure_literals(
+                        new_sigma, new_variables)
                 new_sigma, new_variables = unit_clause(
                     new_sigma, new_variables)
+                if self.__propagators:
+                    literals, unassigned = self.__newly_assigned(
+                        new_variables, unassigned)
+                    new_sigma = self.__implied(
+                        new_sigma, new_variables, literals)
                 new_sigma = self.__assign_simplify(new_sigma, new_variables)
 
+            # Probe for failed literals at the root and periodically
+            if self.probe_budget > 0 and (self.__dpll_calls == 1 or (
+                    self.probe_interval > 0 and
+                    self.__dpll_calls % self.probe_interval == 0)):
+                new_sigma, new_variables, forced = failed_literals(
+                    new_sigma, new_variables, budget=self.probe_budget)
+                if forced:
+                    logger.debug(f'PROBING forced {forced} literals')
+                self.__forced += forced
+                if self.__propagators:
+                    literals, unassigned = self.__newly_assigned(
+                        new_variables, unassigned)
+                    new_sigma = self.__assign_simplify(self.__implied(
+                        new_sigma, new_variables, literals), new_variables)
+
             self.variables = new_variables
 
             # Check if we now fulfill the criteria for SAT or UNSAT
             if len(new_sigma) < 1 or [] in new_sigma or self.unknowns < 1:
-                return self.__dpll(new_sigma, new_variables)
+                return (yield from self.__dpll(new_sigma, new_variables))
+
+            # Solve independent parts separately, so that a conflict in
+            # one part never backtracks over the decisions of another
+            if self.components and not self.__enumerating:
+                parts = connected_components(new_sigma)
+                if len(parts) > 1:
+                    return (yield from self.__solve_components(
+                        parts, new_variables))
 
             """SPLITTING------------------------------------------------
             """
 
             # Copy variables and expression to return to when backtracking
-            sigma_pre_split = dcopy(new_sigma)
-            variables_pre_split = dcopy(new_variables)
+            # (clauses are never modified in place, so they can be shared)
+            sigma_pre_split = list(new_sigma)
+            variables_pre_split = dict(new_variables)
 
             # Choose predicate and value using a split heuristic function
             # This function is defined separately and fed to the __init__ function.
@@ -167,12 +400,20 @@ class Solver(ABC):
 
             # Set predicate to value and recurse
             new_variables[predicate] = val
+            new_sigma = self.__implied(
+                new_sigma, new_variables, [predicate if val else -predicate])
             new_sigma = self.__assign_simplify(new_sigma, new_variables)
             logger.debug(f"SPLIT: {predicate} = {val}")
             self.__splits += 1
-            res, var = self.__dpll(new_sigma, new_variables)
+            models_before = len(self.__models)
+            res, var = yield from self.__dpll(new_sigma, new_variables)
             if not res:
-                self.__backtracks += 1
+                # Going on after finding models is no failed search, so
+                # it does not count towards the backtrack threshold
+                if len(self.__models) > models_before:
+                    self.__model_backtracks += 1
+                else:
+                    self.__backtracks += 1
                 logger.debug(f"BACKTRACK: {predicate} = {not val}")
 
                 # Invert the value
@@ -181,12 +422,176 @@ class Solver(ABC):
                 variables = variables_pre_split
                 sigma = sigma_pre_split
                 variables[predicate] = val
+                sigma_pre_split = self.__implied(
+                    sigma_pre_split, variables,
+                    [predicate if val else -predicate])
                 # Simplify and recurse
                 new_sigma = self.__assign_simplify(sigma_pre_split, variables)
-                return self.__dpll(sigma_pre_split, variables)
+                return (yield from self.__dpll(sigma_pre_split, variables))
             else:
                 return res, var
 
+    def __solve_components(self, parts: List[List[List]], variables: dict):
+        """Solve each component in turn and combine their values
+
+        The values (or unsatisfiability) of every component solved are
+        cached by its clauses, so a component that reappears elsewhere
+        in the search is not solved again.
+
+        Returns
+        -------
+        Tuple
+            The satisfiability of all components, the variable values.
+        """
+        self.__decompositions += 1
+        logger.debug(f'COMPONENTS: {[len(part) for part in parts]}')
+        for part in parts:
+            key = component_key(part)
+            if key in self.__component_cache:
+                self.__component_hits += 1
+                values = self.__component_cache[key]
+            else:
+                res, var = yield from self.__dpll(part, dict(variables))
+                if res:
+                    values = {abs(lit): var[abs(lit)]
+                              for clause in part for lit in clause}
+                elif self.__timedout or self.__cancelled:
+                    return False, variables
+                else:
+                    values = None
+                self.__component_cache[key] = values
+            if values is None:
+                logger.debug('UNSAT (component)')
+                return False, variables
+            variables.update(values)
+        self.variables = variables
+        return True, variables
+
+    def __record_model(self, variables: dict) -> bool:
+        """Store a model found during enumeration
+
+        Parameters
+        ----------
+        variables : dict
+            The variable values at a satisfied leaf of the search.
+
+        Returns
+        -------
+        bool
+            `True` if enough models have been found to stop the search,
+            else `False` to continue it.
+        """
+        free = len([v for v in variables if variables[v] is None and
+                    v not in self.__substituted])
+        if self.__graph is not None:
+            # A free representative gets a concrete value, so that the
+            # variables it stands for get one too
+            variables = dict(variables)
+            for lit, rep in self.__graph.representative.items():
+                if rep != lit and variables[abs(rep)] is None:
+                    variables[abs(rep)] = False
+            variables = self.__graph.expand(variables)
+        self.__models.append(dict(variables))
+        self.__model_count += 2**free
+        logger.debug(f'MODEL {len(self.__models)} ({2**free} assignments)')
+        return (self.__max_models is not None and
+                self.__model_count >= self.__max_models)
+
+    def __build_amo(self):
+        """Replace pairwise at-most-one encodings by native constraints"""
+        self.__working, constraints, exactly_one = detect_amo(self.__working)
+        self.__amo = AtMostOne(constraints)
+        self.__propagators.append(self.__amo)
+        logger.info(f'Cardinality: {len(constraints)} at-most-one '
+                    f'constraints ({exactly_one} exactly-one), '
+                    f'{len(self.__working)} clauses left')
+
+    def __build_graph(self):
+        """Move the binary clauses into an implication graph
+
+        The remaining clauses (and at-most-one constraints) are rewritten
+        in terms of the representatives of equivalent literals.
+        """
+        sigma = self.__working
+        binaries = [c for c in sigma if len(c) == 2 and c[0] != c[1]]
+        self.__graph = ImplicationGraph(binaries)
+        self.__propagators.append(self.__graph)
+        self.__substituted = {abs(lit) for lit, rep in
+                              self.__graph.representative.items()
+                              if rep != lit}
+        logger.info(f'Implication graph: {len(binaries)} binary clauses, '
+                    f'{self.__graph.edges} implications, '
+                    f'{len(self.__substituted)} equivalent variables')
+
+        if self.__graph.unsatisfiable:
+            self.__working = [[]]
+            return
+
+        self.__working = []
+        for clause in sigma:
+            if len(clause) == 2 and clause[0] != clause[1]:
+                continue
+            lits = list(dict.fromkeys(self.__graph.rep(lit) for lit in clause))
+            if not any(-lit in lits for lit in lits):
+                self.__working.append(lits)
+
+        if self.__amo is not None:
+            constraints = []
+            for lits in self.__amo.constraints:
+                reps = [self.__graph.rep(lit) for lit in lits]
+                # Two equivalent literals in one constraint are both false
+                self.__working.extend([-lit] for lit in set(reps)
+                                      if reps.count(lit) > 1)
+                reps = list(dict.fromkeys(reps))
+                complements = {lit for lit in reps if -lit in reps}
+                if len(complements) > 2:
+                    # Each complementary pair has a true literal, so two
+                    # pairs make at least two true literals
+                    self.__working.append([])
+                    continue
+                if complements:
+                    # One of a literal and its negation is true, so the
+                    # others are false and the constraint always holds
+                    self.__working.extend([-lit] for lit in reps
+                                          if lit not in complements)
+                    continue
+                constraints.append(reps)
+            self.__amo = AtMostOne(constraints)
+            self.__propagators[0] = self.__amo
+
+    def __implied(self, sigma: List[List], variables: dict,
+                  literals: List[int]) -> List[List]:
+        """Propagate newly true `literals` through the native constraints
+
+        Returns
+        -------
+        List[List]
+            `sigma`, with an empty clause added if there was a conflict.
+        """
+        pending = list(literals)
+        while pending:
+            assigned = []
+            for propagator in self.__propagators:
+                implied = propagator.propagate(variables, pending)
+                if implied is None:
+                    return sigma + [[]]
+                assigned.extend(implied)
+            pending = assigned
+        return sigma
+
+    def __newly_assigned(self, variables: dict, unassigned: List) -> Tuple:
+        """Find which of the `unassigned` variables now have a value
+
+        Returns
+        -------
+        Tuple
+            The newly assigned variables as true literals, and the
+            variables that are still unassigned.
+        """
+        literals = [v if variables[v] else -v for v in unassigned
+                    if variables[v] is not None]
+        return literals, [v for v in unassigned if variables[v] is None]
+
     def __diff_shape(self, a: List[List], b: List[List]) -> bool:
         """Compare shape of two nested lists
 
@@ -231,29 +636,7 @@ class Solver(ABC):
             A nested list of `int` or `bool` literals similar to `sigma`
         """
 
-        def no_truths(clause):
-            """Checks if not truths in a clause (ignoring literal 1)"""
-            for lit in clause:
-                if lit is True and isinstance(lit, bool):
-                    return False
-            return True
-
-        new_sigma = []
-        for clause in sigma:
-            new_clause = []
-            for lit in clause:
-                if values[abs(lit)] is not None:
-                    val = values[abs(lit)]
-                    sign = 1 if lit > 0 else -1
-                    lit_val = val if sign == 1 else (not val)
-                    if lit_val:
-                        new_clause.append(lit_val)
-                else:
-                    new_clause.append(lit)
-            if no_truths(new_clause):  # Keep only if clause contains no `True`
-                new_sigma.append(new_clause)
-
-        return new_sigma
+        return assign_values(sigma, values)
 
     def __repr__(self):
         """String formatting for the class
@@ -285,6 +668,10 @@ def verify_sat(sigma: List[List], end_values: dict) -> bool:
     """
     new_sigma = []
     for clause in sigma:
+        # Tautologies hold whatever the values (which may be left `None`)
+        if any(-lit in clause for lit in clause):
+            new_sigma.append([True])
+            continue
         new_clause = []
         for lit in clause:
             val = end_values[abs(lit)]
@@ -0,0 +1,87 @@
+"""asyncio entry points for the DPLL solver.
+
+The solver can either be driven cooperatively on the event loop, pausing
+every few DPLL calls, or offloaded to a (thread) executor. In both cases
+cancelling the awaiting task, or running out of time, cancels the solver.
+"""
+
+import asyncio
+from typing import Callable, Optional
+from concurrent.futures import Executor
+
+from algorithm import Solver
+
+
+async def solve_async(solver: Solver,
+                      yield_every=100,
+                      timeout: Optional[float] = None,
+                      progress: Optional[Callable[[dict], None]] = None,
+                      executor: Optional[Executor] = None) -> bool:
+    """Find whether the solver's expression is `SAT` without blocking.
+
+    Parameters
+    ----------
+    solver : Solver
+        A solver that has not been run yet.
+    yield_every : int, optional
+        The number of DPLL calls between pauses, by default 100.
+    timeout : float, optional
+        Seconds after which the solver is cancelled and
+        `asyncio.TimeoutError` is raised, by default None (no deadline).
+    progress : Callable[[dict], None], optional
+        Called on the event loop with the solver `progress` at every
+        pause, by default None.
+    executor : Executor, optional
+        Run the search in this executor instead of on the event loop,
+        by default None. It must share memory with the caller, i.e. be a
+        `ThreadPoolExecutor`.
+
+    Returns
+    -------
+    bool
+        `True` if satisfiable, else `False` (see `Solver.solve`).
+    """
+
+    if executor is None:
+        search = _drive(solver, yield_every, progress)
+    else:
+        search = _offload(solver, yield_every, progress, executor)
+
+    try:
+        return await asyncio.wait_for(search, timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        solver.cancel()
+        raise
+
+
+async def _drive(solver: Solver, yield_every: int, progress) -> bool:
+    """Step through the solver on the event loop."""
+
+    steps = solver.steps(every=yield_every)
+    while True:
+        try:
+            state = next(steps)
+        except StopIteration as stop:
+            return stop.value
+        if progress is not None:
+            progress(state)
+        await asyncio.sleep(0)
+
+
+async def _offload(solver: Solver, yield_every: int, progress,
+                   executor: Executor) -> bool:
+    """Step through the solver in an executor, reporting to the loop."""
+
+    loop = asyncio.get_running_loop()
+
+    def run():
+        steps = solver.steps(every=yield_every)
+        while True:
+            try:
+                state = next(steps)
+            except StopIteration as stop:
+                return stop.value
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, state)
+
+    return await loop.run_in_executor(executor, run)
@@ -0,0 +1,603 @@
+"""Persistent cache of solved expressions, shared by symmetric sudokus
+
+Results are stored in a sqlite database under a content hash of the
+expression, so a repeated instance is answered without searching. A
+sudoku is keyed by the canonical form of its givens under the symmetry
+group of the sudoku (relabelling the digits, permuting the bands and
+stacks, the rows and columns within them, and transposing), and the
+cached solution is mapped back to the instance through the symmetry.
+"""
+
+import functools
+import hashlib
+import importlib.util
+import itertools
+import json
+import math
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from algorithm import verify_sat
+from components import component_key
+
+
+# Key a sudoku on its exact CNF when this many orderings tie for the
+# canonical form (like an almost empty grid), as the search would blow up
+MAX_CANONICAL_STATES = 20000
+
+# The modules whose code decides a conclusion. An UNSAT result cannot be
+# verified, so it is only trusted from the same code (see `solver_version`)
+SOLVER_MODULES = ['algorithm', 'simplifications', 'heuristics',
+                  'implications', 'cardinality', 'components',
+                  'local_search', 'dlx']
+
+# Whether the rules of a sudoku (by CNF key) are invariant under its
+# symmetry group, so the check is done once per process
+_SYMMETRIC_RULES = {}
+
+
+def _digest(text: str) -> str:
+    """Returns the hex SHA-256 digest of a string"""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def cnf_key(sigma: List[List[int]]) -> str:
+    """Returns a hash identifying an expression.
+
+    The hash does not depend on the order of the clauses or of the
+    literals within them, nor on repeated clauses or literals.
+    """
+    return _digest(repr(sorted(component_key(sigma))))
+
+
+@functools.lru_cache(maxsize=None)
+def solver_version() -> str:
+    """Returns a hash of the source of the `SOLVER_MODULES`, which
+    changes with any fix to the solvers."""
+
+    digest = hashlib.sha256()
+    for name in SOLVER_MODULES:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin is not None:
+            with open(spec.origin, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def line_permutations(size: int) -> Tuple[Tuple[int, ...], ...]:
+    """Returns the orders of the rows (or columns) of a sudoku that keep
+    its blocks intact: the bands in any order, and the rows of each band
+    in any order.
+    """
+
+    block = math.isqrt(size)
+    perms = []
+    for bands in itertools.permutations(range(block)):
+        for inner in itertools.product(
+                itertools.permutations(range(block)), repeat=block):
+            perms.append(tuple(band * block + i
+                               for band, order in zip(bands, inner)
+                               for i in order))
+    return tuple(perms)
+
+
+def canonical_grid(grid: List[List[int]], max_states=MAX_CANONICAL_STATES):
+    """Find the canonical form of a sudoku grid under its symmetry group.
+
+    The canonical form is the lexicographically smallest grid (read row
+    by row, empty cells first) over all transpositions, row and column
+    orders that keep the blocks intact, with the digits relabelled in
+    order of appearance. It is built one row at a time, keeping only the
+    orderings that tie for the smallest rows so far.
+
+    Parameters
+    ----------
+    grid : List[List[int]]
+        The rows of the sudoku, with 0 for empty cells.
+    max_states : int, optional
+        The number of tied orderings at which to give up,
+        by default `MAX_CANONICAL_STATES`
+
+    Returns
+    -------
+    Tuple[List[List[int]], tuple] or None
+        The canonical grid and the transform that produced it (see
+        `to_canonical`), or `None` if the search gave up.
+    """
+
+    size = len(grid)
+    block = math.isqrt(size)
+    grids = [grid, [list(col) for col in zip(*grid)]]
+    perms = line_permutations(size)
+
+    # An ordering is (transposed, columns, rows so far, digit labels)
+    states = [(t, cols, (), {}) for t in (0, 1) for cols in perms]
+    canonical = []
+    for depth in range(size):
+        best, ties = None, []
+        for t, cols, rows, labels in states:
+            if depth % block == 0:
+                used = {r // block for r in rows}
+                allowed = [r for r in range(size) if r // block not in used]
+            else:
+                band = rows[-1] // block
+                allowed = [r for r in range(band * block, band * block + block)
+                           if r not in rows]
+            for r in allowed:
+                row = grids[t][r]
+                new, values = None, []
+                for c in cols:
+                    digit = row[c]
+                    if not digit:
+                        values.append(0)
+                        continue
+                    label = (labels if new is None else new).get(digit)
+                    if label is None:
+                        if new is None:
+                            new = dict(labels)
+                        label = new[digit] = len(new) + 1
+                    values.append(label)
+                if best is None or values < best:
+                    best, ties = values, []
+                if values == best:
+                    ties.append((t, cols, rows + (r,),
+                                 labels if new is None else new))
+        if len(ties) > max_states:
+            return None
+        canonical.append(best)
+        states = ties
+
+    # Any of the remaining orderings is an automorphism of the others
+    t, cols, rows, labels = states[0]
+    labels = dict(labels)
+    unused = [label for label in range(1, size + 1)
+              if label not in labels.values()]
+    for digit in range(1, size + 1):
+        if digit not in labels:
+            labels[digit] = unused.pop(0)
+    labels[0] = 0
+    return canonical, (bool(t), rows, cols, labels)
+
+
+def to_canonical(grid: List[List[int]], transform: tuple) -> List[List[int]]:
+    """Apply the transform of `canonical_grid` to a grid"""
+    transposed, rows, cols, labels = transform
+    if transposed:
+        grid = [list(col) for col in zip(*grid)]
+    return [[labels[grid[r][c]] for c in cols] for r in rows]
+
+
+def from_canonical(grid: List[List[int]], transform: tuple) -> List[List[int]]:
+    """Undo the transform of `canonical_grid` on a grid"""
+    transposed, rows, cols, labels = transform
+    digits = {label: digit for digit, label in labels.items()}
+    size = len(grid)
+    original = [[0] * size for _ in range(size)]
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            original[r][c] = digits[grid[i][j]]
+    if transposed:
+        original = [list(col) for col in zip(*original)]
+    return original
+
+
+def _decode(v: int, size: int):
+    """Returns the zero-based (row, column, digit) of a sudoku variable"""
+    cell = (v // 100 - 1, v // 10 % 10 - 1, v % 10 - 1)
+    if v < 1000 and all(0 <= x < size for x in cell):
+        return cell
+    return None
+
+
+def _split_givens(sigma: List[List[int]], size: int):
+    """Split a sudoku into the grid of its givens and its other clauses.
+
+    The grid is `None` if the givens are no valid sudoku placements.
+    """
+
+    grid = [[0] * size for _ in range(size)]
+    rules = []
+    for clause in sigma:
+        if len(clause) != 1 or clause[0] < 0:
+            rules.append(clause)
+            continue
+        cell = _decode(clause[0], size)
+        if cell is None:
+            return None, None
+        r, c, d = cell
+        if grid[r][c] not in (0, d + 1):
+            return None, None
+        grid[r][c] = d + 1
+    return grid, rules
+
+
+def _is_symmetric(rules: List[List[int]], size: int) -> bool:
+    """Whether the rules are unchanged by the sudoku symmetry group.
+
+    Checks its generators: the transposition, and swapping neighbouring
+    rows of the first band, neighbouring bands and neighbouring digits.
+    """
+
+    block = math.isqrt(size)
+    cells = {}
+    for clause in rules:
+        for lit in clause:
+            cell = _decode(abs(lit), size)
+            if cell is None:
+                return False
+            cells[abs(lit)] = cell
+
+    def swap(a, b):
+        return lambda x: b if x == a else a if x == b else x
+
+    def band_swap(a, b):
+        return lambda x: ({a: b, b: a}.get(x // block, x // block) * block
+                          + x % block)
+
+    moves = [lambda r, c, d: (c, r, d)]
+    for k in range(block - 1):
+        moves.append(lambda r, c, d, f=swap(k, k + 1): (f(r), c, d))
+        moves.append(lambda r, c, d, f=band_swap(k, k + 1): (f(r), c, d))
+    for k in range(size - 1):
+        moves.append(lambda r, c, d, f=swap(k, k + 1): (r, c, f(d)))
+
+    clauses = frozenset(tuple(sorted(set(clause))) for clause in rules)
+    for move in moves:
+        mapping = {}
+        for v, cell in cells.items():
+            r, c, d = move(*cell)
+            mapping[v] = (r + 1) * 100 + (c + 1) * 10 + d + 1
+        moved = frozenset(
+            tuple(sorted({mapping[lit] if lit > 0 else -mapping[-lit]
+                          for lit in clause}))
+            for clause in clauses)
+        if moved != clauses:
+            return False
+    return True
+
+
+def cache_key(sigma: List[List[int]], sudoku=False, size=9):
+    """Returns the key of an expression in a `ResultCache`.
+
+    Parameters
+    ----------
+    sigma : List[List[int]]
+        A PL expression in DIMACS encoding.
+    sudoku : bool, optional
+        Whether `sigma` is a sudoku (rules and givens as positive unit
+        clauses), by default False. Its givens are then keyed by their
+        canonical form, provided its rules are invariant under the
+        symmetries (as the standard rules are).
+    size : int, optional
+        The side of the sudoku, by default 9
+
+    Returns
+    -------
+    Tuple[str, tuple]
+        The key, and the transform to the canonical form of the sudoku
+        (or `None` if keyed on the exact expression).
+    """
+
+    if sudoku and size <= 9:
+        grid, rules = _split_givens(sigma, size)
+        if grid is not None:
+            rules_key = cnf_key(rules)
+            if rules_key not in _SYMMETRIC_RULES:
+                _SYMMETRIC_RULES[rules_key] = _is_symmetric(rules, size)
+            found = None
+            if _SYMMETRIC_RULES[rules_key]:
+                found = canonical_grid(grid)
+            if found is not None:
+                canonical, transform = found
+                text = ''.join(str(v) for row in canonical for v in row)
+                return _digest(f'sudoku{size}:{rules_key}:{text}'), transform
+    return cnf_key(sigma), None
+
+
+class ResultCache:
+    """A sqlite store of solved expressions that evicts the least
+    recently used results beyond `max_entries`.
+
+    Satisfiable results keep the true variables of their model, or the
+    canonical solution grid for sudokus keyed by their symmetry. Models
+    are verified against the expression on every hit, and entries that
+    fail are dropped. Unsatisfiable results cannot be verified, so they
+    are tagged with the solver that concluded them and only returned
+    to the same solver. Several processes can share the same file.
+    """
+
+    def __init__(self, path='result-cache.sqlite', max_entries=100000):
+        """Constructor for `ResultCache` class
+
+        Parameters
+        ----------
+        path : str, optional
+            The database file, created if missing,
+            by default 'result-cache.sqlite'
+        max_entries : int, optional
+            The number of results to keep, by default 100000
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__db = sqlite3.connect(path, timeout=30.)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS results ('
+                          'key TEXT PRIMARY KEY, satisfiable INTEGER NOT NULL, '
+                          'model TEXT, used REAL NOT NULL, solver TEXT)')
+        columns = [row[1] for row in
+                   self.__db.execute('PRAGMA table_info(results)')]
+        if 'solver' not in columns:
+            self.__db.execute('ALTER TABLE results ADD COLUMN solver TEXT')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS results_used '
+                          'ON results (used)')
+        self.__db.commit()
+
+    def __len__(self):
+        return self.__db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, key: str):
+        """Returns the stored (satisfiable, model, solver) of a key, or
+        `None`"""
+        row = self.__db.execute('SELECT satisfiable, model, solver FROM '
+                                'results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self.__db:
+            self.__db.execute('UPDATE results SET used = ? WHERE key = ?',
+                              (time.time(), key))
+        return bool(row[0]), row[1], row[2]
+
+    def put(self, key: str, satisfiable: bool, model: Optional[str],
+            solver: Optional[str] = None):
+        """Store a result, evicting the least recently used beyond
+        `max_entries`."""
+        with self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO results (key, '
+                              'satisfiable, model, used, solver) '
+                              'VALUES (?, ?, ?, ?, ?)',
+                              (key, int(satisfiable), model, time.time(),
+                               solver))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.__db.execute('DELETE FROM results WHERE key IN (SELECT '
+                                  'key FROM results ORDER BY used LIMIT ?)',
+                                  (excess,))
+
+    def discard(self, key: str):
+        """Remove a result"""
+        with self.__db:
+            self.__db.execute('DELETE FROM results WHERE key = ?', (key,))
+
+    def lookup(self, sigma: List[List[int]], key: str, transform=None,
+               solver: Optional[str] = None):
+        """Find the result of an expression.
+
+        Parameters
+        ----------
+        sigma : List[List[int]]
+            The expression.
+        key, transform
+            Its key and sudoku transform, as given by `cache_key`.
+        solver : str, optional
+            The tag of the solver asking (see `CachedSolver`). An
+            unsatisfiable result is a miss for other solvers.
+
+        Returns
+        -------
+        Tuple[bool, Dict[int, bool]] or None
+            Whether it is satisfiable and the verified model (all `None`
+            if unsatisfiable), or `None` on a miss.
+        """
+
+        found = self.get(key)
+        if found is None:
+            self.misses += 1
+            return None
+
+        satisfiable, model, tag = found
+        if not satisfiable and tag != solver:
+            self.misses += 1
+            return None
+        variables = {abs(lit): None for clause in sigma for lit in clause}
+        if satisfiable:
+            for v in variables:
+                variables[v] = False
+            if transform is None:
+                truths = json.loads(model)
+            else:
+                size = len(transform[1])
+                canonical = [[int(x) for x in model[r * size:(r + 1) * size]]
+                             for r in range(size)]
+                grid = from_canonical(canonical, transform)
+                truths = [(r + 1) * 100 + (c + 1) * 10 + d
+                          for r, row in enumerate(grid)
+                          for c, d in enumerate(row)]
+            for v in truths:
+                variables[v] = True
+            if not verify_sat(sigma, variables):
+                logger.warning(f'Dropping cached model {key[:12]} that '
+                               'does not satisfy the expression')
+                self.discard(key)
+                self.misses += 1
+                return None
+
+        self.hits += 1
+        return satisfiable, variables
+
+    def store(self, key: str, transform, satisfiable: bool,
+              variables: Dict[int, bool], solver: Optional[str] = None) -> bool:
+        """Store the result of an expression.
+
+        Parameters
+        ----------
+        key, transform
+            Its key and sudoku transform, as given by `cache_key`.
+        satisfiable : bool
+            Whether the expression is satisfiable.
+        variables : Dict[int, bool]
+            The model found, if satisfiable.
+        solver : str, optional
+            The tag of the solver that found the result.
+
+        Returns
+        -------
+        bool
+            Whether it was stored (a sudoku model must fill the grid).
+        """
+
+        model = None
+        if satisfiable:
+            truths = sorted(v for v in variables if variables[v] is True)
+            if transform is None:
+                model = json.dumps(truths)
+            else:
+                size = len(transform[1])
+                grid = [[0] * size for _ in range(size)]
+                for v in truths:
+                    cell = _decode(v, size)
+                    if cell is not None:
+                        grid[cell[0]][cell[1]] = cell[2] + 1
+                if any(0 in row for row in grid):
+                    return False
+                model = ''.join(str(d) for row in to_canonical(grid, transform)
+                                for d in row)
+        self.put(key, satisfiable, model, solver)
+        return True
+
+    def close(self):
+        """Close the database"""
+        self.__db.close()
+
+
+class CachedSolver:
+    """Answers from a `ResultCache` when it can, and runs (then stores
+    the result of) a real solver when it cannot.
+
+    The lookup happens on construction, so on a hit no solver is built.
+    """
+
+    def __init__(self, cache: ResultCache, sigma: List[List[int]], build,
+                 sudoku=False, size=9, config=''):
+        """Constructor for `CachedSolver` class
+
+        Parameters
+        ----------
+        cache : ResultCache
+            The cache to use.
+        sigma : List[List[int]]
+            A PL expression in DIMACS encoding.
+        build : function
+            Called without arguments to build the solver on a miss.
+        sudoku : bool, optional
+            Whether `sigma` is a sudoku, so symmetric sudokus share
+            results, by default False
+        size : int, optional
+            The side of the sudoku, by default 9
+        config : str, optional
+            The settings of the solver that `build` returns (such as its
+            engine and options), by default ''. Together with the
+            `solver_version` it tags the unsatisfiable results.
+        """
+
+        start_time = time.time()
+        self.cache = cache
+        self.sigma = sigma
+        self.__tag = f'{solver_version()}:{config}'
+        self.__key, self.__transform = cache_key(sigma, sudoku, size)
+        self.__hit = cache.lookup(sigma, self.__key, self.__transform,
+                                  self.__tag)
+        self.__lookup_time = time.time() - start_time
+        self.__solver = None
+        if self.__hit is None:
+            self.__solver = build()
+            self.variables = self.__solver.variables
+        else:
+            self.variables = self.__hit[1]
+
+    @property
+    def hit(self) -> bool:
+        """Whether the result came from the cache"""
+        return self.__hit is not None
+
+    def solve(self) -> bool:
+        """Find whether the expression is satisfiable
+
+        Returns
+        -------
+        bool
+            `True` if satisfiable, else `False`.
+            (Note: will also be `False` in case of timeout.)
+        """
+        steps = self.steps(every=0)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def steps(self, every=1000):
+        """Run the solver on a miss as a generator (see `Solver.steps`),
+        storing its conclusion."""
+        if self.__hit is not None:
+            return self.__hit[0]
+
+        res = yield from self.__solver.steps(every)
+        self.variables = self.__solver.variables
+        conclusion = self.__solver.performance['conclusion']
+        if conclusion == 'UNSAT' or (
+                conclusion == 'SAT' and verify_sat(self.sigma, self.variables)):
+            self.cache.store(self.__key, self.__transform, res,
+                             self.variables, self.__tag)
+        return res
+
+    def cancel(self):
+        """Ask a running solver to stop."""
+        if self.__solver is not None:
+            self.__solver.cancel()
+
+    @property
+    def performance(self) -> dict:
+        """Returns performance statistics"""
+        if self.__hit is None:
+            perf = dict(self.__solver.performance, cache='miss')
+        else:
+            perf = {'heuristic': 'cache', 'cache': 'hit',
+                    'conclusion': 'SAT' if self.__hit[0] else 'UNSAT'}
+        perf['lookup_time'] = self.__lookup_time
+        return perf
+
+    @property
+    def progress(self) -> dict:
+        """Returns the progress of a running search"""
+        if self.__solver is None:
+            return {'unknowns': self.unknowns}
+        return self.__solver.progress
+
+    @property
+    def timedout(self) -> bool:
+        """Whether the solver timed out before reaching a conclusion."""
+        return self.__solver is not None and self.__solver.timedout
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the solver was cancelled before reaching a conclusion."""
+        return self.__solver is not None and self.__solver.cancelled
+
+    @property
+    def unknowns(self) -> int:
+        """Returns a count of the variables with unknown values."""
+        return len([v for v in self.variables if self.variables[v] is None])
+
+    def __repr__(self):
+        """String formatting for the class
+        """
+        if self.__solver is not None:
+            return repr(self.__solver)
+        return "<cache.CachedSolver metrics={}".format(self.performance)
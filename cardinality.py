@@ -0,0 +1,158 @@
+"""Native at-most-one constraints and their detection in CNF"""
+
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+
+def detect_amo(sigma: List[List[int]], min_size=3) -> Tuple:
+    """Recognise pairwise at-most-one encodings in an expression.
+
+    The binary clause `-a -b` says that at most one of `a` and `b` is
+    true. A set of literals where every pair is covered by such a clause
+    (a clique) is an at-most-one constraint. Longer clauses whose literals
+    form a clique become exactly-one constraints: the clause itself is
+    kept, and its binary clauses are replaced by the native constraint.
+    Other cliques are found greedily among the remaining binary clauses.
+
+    Parameters
+    ----------
+    sigma : List[List[int]]
+        A PL expression in DIMACS encoding.
+    min_size : int, optional
+        The smallest clique to turn into a constraint, by default 3
+
+    Returns
+    -------
+    Tuple
+        The expression without the binary clauses that are covered by a
+        constraint, the at-most-one constraints as lists of literals,
+        and how many of them are exactly-one constraints.
+    """
+
+    adjacent = defaultdict(set)
+    for clause in sigma:
+        if len(clause) == 2 and clause[0] != -clause[1] and \
+                clause[0] != clause[1]:
+            a, b = -clause[0], -clause[1]
+            adjacent[a].add(b)
+            adjacent[b].add(a)
+
+    def is_clique(lits):
+        return all(b in adjacent[a] for i, a in enumerate(lits)
+                   for b in lits[i + 1:])
+
+    amos = []
+    covered = set()
+
+    def add(lits):
+        amos.append(lits)
+        for i, a in enumerate(lits):
+            for b in lits[i + 1:]:
+                covered.add(frozenset([a, b]))
+
+    # Exactly-one: clauses whose literals are pairwise exclusive
+    seen = set()
+    for clause in sigma:
+        lits = list(dict.fromkeys(clause))
+        key = frozenset(lits)
+        if len(lits) >= min_size and key not in seen and is_clique(lits):
+            seen.add(key)
+            add(lits)
+    exactly_one = len(amos)
+
+    # At-most-one: grow cliques greedily from the uncovered edges
+    def uncovered(a):
+        return [b for b in adjacent[a] if frozenset([a, b]) not in covered]
+
+    found = True
+    while found:
+        found = False
+        for node in sorted(adjacent, key=lambda a: -len(uncovered(a))):
+            candidates = uncovered(node)
+            if len(candidates) < min_size - 1:
+                continue
+            clique = [node]
+            for other in sorted(candidates, key=lambda b: -len(adjacent[b])):
+                if all(other in adjacent[member] for member in clique):
+                    clique.append(other)
+            if len(clique) >= min_size:
+                add(clique)
+                found = True
+
+    remaining = [clause for clause in sigma
+                 if not (len(clause) == 2 and
+                         frozenset([-clause[0], -clause[1]]) in covered)]
+
+    return remaining, amos, exactly_one
+
+
+class AtMostOne:
+    """Propagator for native at-most-one constraints over literal sets.
+    """
+
+    def __init__(self, constraints: List[List[int]]):
+        """Constructor for `AtMostOne` class
+
+        Parameters
+        ----------
+        constraints : List[List[int]]
+            Sets of literals of which at most one may be true.
+        """
+
+        self.constraints = constraints
+        self.watches = defaultdict(list)
+        for i, lits in enumerate(constraints):
+            for lit in lits:
+                self.watches[lit].append(i)
+
+    def propagate(self, variables: dict,
+                  literals: Iterable[int]) -> Optional[List[int]]:
+        """Falsify the other literals of constraints with a true literal.
+
+        Parameters
+        ----------
+        variables : dict
+            The literal names and current values, updated in place.
+        literals : Iterable[int]
+            Literals which have just become `True`.
+
+        Returns
+        -------
+        Optional[List[int]]
+            The literals this made `True`, or `None` if a constraint
+            has two true literals.
+        """
+
+        queue = list(literals)
+        assigned = []
+        while queue:
+            lit = queue.pop()
+            for i in self.watches.get(lit, ()):
+                for other in self.constraints[i]:
+                    if other == lit:
+                        continue
+                    val = variables[abs(other)]
+                    if val is None:
+                        variables[abs(other)] = other < 0
+                        queue.append(-other)
+                        assigned.append(-other)
+                    elif val == (other > 0):
+                        return None
+        return assigned
+
+    def residual_clauses(self, variables: dict) -> List[List[int]]:
+        """Returns the pairwise clauses of constraints still open.
+
+        These are the constraints with no true literal and at least two
+        unassigned literals. A literal and its negation never make a
+        clause, as that pair is always allowed.
+        """
+
+        clauses = []
+        for lits in self.constraints:
+            if any(variables[abs(lit)] == (lit > 0) for lit in lits):
+                continue
+            free = [lit for lit in lits if variables[abs(lit)] is None]
+            clauses.extend([-a, -b] for i, a in enumerate(free)
+                           for b in free[i + 1:] if a != -b)
+        return clauses
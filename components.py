@@ -0,0 +1,53 @@
+"""Decomposition of expressions into independent components"""
+
+from collections import defaultdict
+from typing import FrozenSet, List, Tuple
+
+
+def connected_components(sigma: List[List[int]]) -> List[List[List[int]]]:
+    """Split an expression into parts that share no variables.
+
+    Variables are joined with a union-find structure whenever they occur
+    in the same clause, so this takes a single pass over `sigma`.
+
+    Parameters
+    ----------
+    sigma : List[List[int]]
+        A PL expression in DIMACS encoding, without empty clauses.
+
+    Returns
+    -------
+    List[List[List[int]]]
+        The clauses of each component, smallest component first.
+    """
+
+    parent = {}
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for clause in sigma:
+        root = None
+        for lit in clause:
+            v = abs(lit)
+            if v not in parent:
+                parent[v] = v
+            if root is None:
+                root = find(v)
+            else:
+                other = find(v)
+                if other != root:
+                    parent[other] = root
+
+    groups = defaultdict(list)
+    for clause in sigma:
+        groups[find(abs(clause[0]))].append(clause)
+    return sorted(groups.values(), key=len)
+
+
+def component_key(sigma: List[List[int]]) -> FrozenSet[Tuple[int, ...]]:
+    """Returns a hashable key identifying a component's clauses"""
+    return frozenset(tuple(sorted(set(clause))) for clause in sigma)
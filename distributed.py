@@ -0,0 +1,501 @@
+"""Distributed benchmark sweeps over plain TCP, without a broker.
+
+A coordinator shards `tester.py` workloads (every dataset x heuristic x
+backtrack threshold, in chunks of rows) into tasks and leases them to
+worker processes, which may run on any number of hosts. Messages are
+newline-delimited JSON over TCP:
+
+    worker -> {"op": "hello", "worker": name}    Name itself, sent first
+                                                 (no reply).
+    worker -> {"op": "get"}                      Ask for a task.
+    coord  -> {"task": {...}} | {"wait": s} | {"done": true}
+    worker -> {"op": "renew", "id": i}           Extend a lease (no reply).
+    worker -> {"op": "result", "id": i, "rows": [...]}
+    worker -> {"op": "failed", "id": i, "error": "..."}
+    coord  -> {"ok": true}
+
+A task whose lease runs out, whose worker disconnects or fails is handed
+out again, up to `retries` times. The rows of the sudoku datasets are
+sent along with the tasks; general CNF files must exist on the workers.
+When every task is done, the results are merged into the usual
+`results/<dataset>/<time>_results.csv` file of each dataset.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List
+
+from loguru import logger
+
+
+class Coordinator:
+    """Hands out tasks under leases and collects their results.
+    """
+
+    def __init__(self, tasks: List[dict], lease=60., retries=2):
+        """Constructor for `Coordinator` class
+
+        Parameters
+        ----------
+        tasks : List[dict]
+            The tasks, each with a unique `id` (see `make_tasks`).
+        lease : float, optional
+            Seconds a worker may hold a task without renewing it,
+            by default 60
+        retries : int, optional
+            How often a failed task is handed out again, by default 2
+        """
+
+        self.tasks = {task['id']: task for task in tasks}
+        self.lease = lease
+        self.retries = retries
+        self.results = {}
+        self.failed = {}
+        self.__pending = deque(self.tasks)
+        self.__leased = {}
+        self.__attempts = {task_id: 0 for task_id in self.tasks}
+        self.__lock = threading.Lock()
+        self.__finished = threading.Event()
+        if not self.tasks:
+            self.__finished.set()
+
+    @property
+    def done(self) -> bool:
+        """Whether every task has a result or has failed for good"""
+        return self.__finished.is_set()
+
+    def wait(self, timeout=None) -> bool:
+        """Wait for all tasks to finish, reclaiming expired leases."""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.__finished.wait(min(1., self.lease / 4)):
+            self.reclaim()
+            if deadline is not None and time.time() > deadline:
+                return False
+        return True
+
+    def acquire(self, worker: str):
+        """Lease the next pending task to `worker`.
+
+        Returns
+        -------
+        dict
+            The task, or `None` if no task is pending right now.
+        """
+        self.reclaim()
+        with self.__lock:
+            if not self.__pending:
+                return None
+            task_id = self.__pending.popleft()
+            self.__attempts[task_id] += 1
+            self.__leased[task_id] = (worker, time.time() + self.lease)
+            logger.info(f'Task {task_id} leased to {worker} '
+                        f'(attempt {self.__attempts[task_id]})')
+            return dict(self.tasks[task_id], lease=self.lease)
+
+    def renew(self, task_id: int, worker: str):
+        """Extend the lease of a task still held by `worker`."""
+        with self.__lock:
+            if self.__leased.get(task_id, (None,))[0] == worker:
+                self.__leased[task_id] = (worker, time.time() + self.lease)
+
+    def complete(self, task_id: int, rows: List[dict], worker: str):
+        """Store the result rows of a task (the first result wins)."""
+        with self.__lock:
+            if task_id in self.results or task_id not in self.tasks:
+                return
+            self.results[task_id] = rows
+            self.failed.pop(task_id, None)
+            self.__leased.pop(task_id, None)
+            if task_id in self.__pending:
+                self.__pending.remove(task_id)
+            logger.info(f'Task {task_id} done by {worker} '
+                        f'({len(self.results)}/{len(self.tasks)})')
+            self.__check_finished()
+
+    def fail(self, task_id: int, error: str, worker: str):
+        """Record a failed attempt at a task."""
+        with self.__lock:
+            if self.__leased.get(task_id, (None,))[0] == worker:
+                del self.__leased[task_id]
+                self.__retry(task_id, error)
+
+    def release(self, worker: str):
+        """Take back the tasks of a worker that disconnected."""
+        with self.__lock:
+            for task_id, (holder, _) in list(self.__leased.items()):
+                if holder == worker:
+                    del self.__leased[task_id]
+                    self.__retry(task_id, f'{worker} disconnected')
+
+    def reclaim(self):
+        """Take back the tasks whose lease has expired."""
+        now = time.time()
+        with self.__lock:
+            for task_id, (holder, deadline) in list(self.__leased.items()):
+                if deadline < now:
+                    del self.__leased[task_id]
+                    self.__retry(task_id, f'lease of {holder} expired')
+
+    def __retry(self, task_id: int, error: str):
+        """Queue a task again, or give up on it after `retries`."""
+        if task_id in self.results:
+            return
+        if self.__attempts[task_id] > self.retries:
+            logger.error(f'Task {task_id} failed: {error}')
+            self.failed[task_id] = error
+            self.__check_finished()
+        else:
+            logger.warning(f'Task {task_id} will be retried: {error}')
+            self.__pending.append(task_id)
+
+    def __check_finished(self):
+        if len(self.results) + len(self.failed) == len(self.tasks):
+            self.__finished.set()
+
+
+def make_handler(coordinator: Coordinator):
+    """Build a TCP request handler bound to `coordinator`."""
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            worker = '{}:{}'.format(*self.client_address)
+            try:
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    message = json.loads(line)
+                    op = message.get('op')
+                    if op == 'hello':
+                        worker = f"{message['worker']}@{worker}"
+                        logger.info(f'Worker {worker} connected')
+                        continue
+                    if op == 'renew':
+                        coordinator.renew(message['id'], worker)
+                        continue
+                    if op == 'get':
+                        task = coordinator.acquire(worker)
+                        if task is not None:
+                            reply = {'task': task}
+                        elif coordinator.done:
+                            reply = {'done': True}
+                        else:
+                            reply = {'wait': 0.5}
+                    elif op == 'result':
+                        coordinator.complete(message['id'], message['rows'],
+                                             worker)
+                        reply = {'ok': True}
+                    elif op == 'failed':
+                        coordinator.fail(message['id'], message['error'],
+                                         worker)
+                        reply = {'ok': True}
+                    else:
+                        reply = {'error': f'Unknown op {op}'}
+                    self.wfile.write(json.dumps(reply).encode() + b'\n')
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f'Worker {worker} dropped: {e}')
+            finally:
+                coordinator.release(worker)
+
+    return Handler
+
+
+def make_tasks(datasets: List[str], heuristics: List[int],
+               thresholds: List[int], chunk=50, general=False,
+               sample=None, options=None) -> List[dict]:
+    """Shard a sweep over datasets, heuristics and thresholds into tasks.
+
+    Parameters
+    ----------
+    datasets : List[str]
+        The `tester.py` dataset CSV files.
+    heuristics : List[int]
+        The heuristics to run, as numbers of the `-S` option.
+    thresholds : List[int]
+        The backtrack thresholds to run.
+    chunk : int, optional
+        The number of dataset rows per task, by default 50
+    general : bool, optional
+        Whether the datasets list general CNF files, by default False
+    sample : int, optional
+        Only use a random sample of this many rows of each dataset.
+    options : dict, optional
+        Further keyword arguments of `test_solver`.
+
+    Returns
+    -------
+    List[dict]
+        The tasks, with the dataset rows included.
+    """
+
+    import pandas as pd
+
+    tasks = []
+    for dataset in datasets:
+        df = pd.read_csv(dataset)
+        if sample is not None:
+            df = df.sample(sample)
+        rows = json.loads(df.to_json(orient='records'))
+        for S in heuristics:
+            for b in thresholds:
+                for start in range(0, len(rows), chunk):
+                    tasks.append({
+                        'id': len(tasks),
+                        'dataset': dataset,
+                        'general': general,
+                        'S': S,
+                        'backtrack_thresh': b,
+                        'options': options or {},
+                        'rows': rows[start:start + chunk],
+                    })
+    return tasks
+
+
+def merge_results(coordinator: Coordinator) -> dict:
+    """Save the results of every dataset as a `tester.py` results CSV.
+
+    Returns
+    -------
+    dict
+        The path of the results file of each dataset.
+    """
+
+    import pandas as pd
+
+    rows = {}
+    for task_id in sorted(coordinator.results):
+        task = coordinator.tasks[task_id]
+        rows.setdefault(task['dataset'], []).extend(
+            coordinator.results[task_id])
+
+    now = datetime.now().strftime("%m-%d-%H_%M_%S")
+    paths = {}
+    for dataset, records in rows.items():
+        path = f'results/{dataset}'
+        if not os.path.exists(path):
+            os.makedirs(path)
+        paths[dataset] = f'{path}/{now}_results.csv'
+        pd.DataFrame(records).to_csv(paths[dataset])
+    return paths
+
+
+def run_task(task: dict, selectors: dict) -> List[dict]:
+    """Run one task with `tester.py` and return its result rows."""
+
+    import pandas as pd
+    from heuristics import SPLIT_HEURISTICS
+    from selector import load_selector
+    from tester import test_solver, test_solver_general
+
+    options = dict(task['options'])
+    selector_path = options.pop('selector', 'selector.json')
+    heuristic, selector = None, None
+    if task['S'] == 0:
+        if selector_path not in selectors:
+            selectors[selector_path] = load_selector(selector_path)
+        selector = selectors[selector_path]
+    else:
+        heuristic = SPLIT_HEURISTICS[task['S'] - 1]
+
+    test = test_solver_general if task['general'] else test_solver
+    df = test(pd.DataFrame(task['rows']), heuristic, selector=selector,
+              backtrack_thresh=task['backtrack_thresh'], **options)
+    df['backtrack_thresh'] = task['backtrack_thresh']
+    return json.loads(df.to_json(orient='records'))
+
+
+def run_worker(host: str, port: int, name=None, connect_timeout=30.):
+    """Fetch and run tasks from a coordinator until it is done.
+
+    Parameters
+    ----------
+    host : str
+        The host of the coordinator.
+    port : int
+        The port of the coordinator.
+    name : str, optional
+        The name reported to the coordinator, by default the hostname
+        and process id
+    connect_timeout : float, optional
+        Seconds to keep trying to reach the coordinator, by default 30
+
+    Returns
+    -------
+    int
+        The number of tasks completed.
+    """
+
+    name = name or f'{socket.gethostname()}-{os.getpid()}'
+    deadline = time.time() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+    reader = sock.makefile('rb')
+    write_lock = threading.Lock()
+
+    def send(message):
+        with write_lock:
+            sock.sendall(json.dumps(message).encode() + b'\n')
+
+    def request(message):
+        send(message)
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Coordinator closed the connection')
+        return json.loads(line)
+
+    send({'op': 'hello', 'worker': name})
+    selectors = {}
+    completed = 0
+    try:
+        while True:
+            reply = request({'op': 'get'})
+            if reply.get('done'):
+                break
+            if 'wait' in reply:
+                time.sleep(reply['wait'])
+                continue
+
+            task = reply['task']
+            stop = threading.Event()
+
+            def heartbeat():
+                while not stop.wait(task['lease'] / 3):
+                    send({'op': 'renew', 'id': task['id']})
+
+            beat = threading.Thread(target=heartbeat, daemon=True)
+            beat.start()
+            try:
+                rows = run_task(task, selectors)
+                message = {'op': 'result', 'id': task['id'], 'rows': rows}
+                completed += 1
+            except Exception as e:
+                logger.error(f'Task {task["id"]} failed: {e}')
+                message = {'op': 'failed', 'id': task['id'],
+                           'error': repr(e)}
+            finally:
+                stop.set()
+                beat.join()
+            request(message)
+    except ConnectionError as e:
+        logger.warning(e)
+    finally:
+        reader.close()
+        sock.close()
+
+    return completed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Distributed benchmark sweeps of the SAT solver.')
+    parser.add_argument('-l', type=str, required=False, choices=[
+                        'DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='The log level to use for stderr.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coord = commands.add_parser('coordinator',
+                                help='Shard a sweep and collect its results.')
+    coord.add_argument('datasets', type=str, nargs='+',
+                       help='The dataset CSV files, as used by tester.py.')
+    coord.add_argument('-S', type=int, nargs='+', default=[1],
+                       choices=[0, 1, 2, 3, 4],
+                       help='The heuristics to run. Default 1.')
+    coord.add_argument('-b', type=int, nargs='+', default=[400],
+                       help='The backtrack thresholds to run. Default 400.')
+    coord.add_argument('-n', type=int, required=False,
+                       help='The size of the sample to take from each dataset.')
+    coord.add_argument('--general', action='store_true',
+                       help='The datasets list general CNF files.')
+    coord.add_argument('--chunk', type=int, default=50,
+                       help='Dataset rows per task. Default 50.')
+    coord.add_argument('--host', type=str, default='0.0.0.0',
+                       help='The address to listen on. Default 0.0.0.0.')
+    coord.add_argument('--port', type=int, default=5555,
+                       help='The port to listen on (0 for any). Default 5555.')
+    coord.add_argument('--lease', type=float, default=60.,
+                       help='Seconds before an unrenewed task is handed out \
+                           again. Default 60.')
+    coord.add_argument('--retries', type=int, default=2,
+                       help='How often a failed task is retried. Default 2.')
+    coord.add_argument('--spawn', type=int, default=0,
+                       help='Also start this many workers on localhost.')
+    coord.add_argument('--engine', type=str, default='dpll',
+                       choices=['dpll', 'walksat', 'probsat', 'portfolio',
+                                'dlx'],
+                       help='The engine the workers use. Default dpll.')
+    coord.add_argument('--selector', type=str, default='selector.json',
+                       help='The trained selector used by -S0 on the workers.')
+
+    work = commands.add_parser('worker', help='Run tasks of a coordinator.')
+    work.add_argument('address', type=str,
+                      help='The HOST:PORT of the coordinator.')
+    work.add_argument('--name', type=str, required=False,
+                      help='The name to report. Default hostname-pid.')
+
+    args = parser.parse_args()
+
+    # Configure logging to stderr
+    logger.remove()
+    logger.add(sys.stderr, level=args.l)
+
+    if args.command == 'worker':
+        host, port = args.address.rsplit(':', 1)
+        # The solver logs every instance, only keep its errors
+        logger.remove()
+        logger.add(sys.stderr, level='ERROR')
+        done = run_worker(host, int(port), name=args.name)
+        print(f'Worker finished {done} tasks')
+        sys.exit(0)
+
+    tasks = make_tasks(args.datasets, args.S, args.b, chunk=args.chunk,
+                       general=args.general, sample=args.n,
+                       options={'engine': args.engine,
+                                'selector': args.selector})
+    coordinator = Coordinator(tasks, lease=args.lease, retries=args.retries)
+    server = socketserver.ThreadingTCPServer((args.host, args.port),
+                                             make_handler(coordinator))
+    server.daemon_threads = True
+    host, port = server.server_address[:2]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Coordinating {len(tasks)} tasks on {host}:{port}')
+
+    workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                 'worker', f'127.0.0.1:{port}'])
+               for _ in range(args.spawn)]
+
+    try:
+        coordinator.wait()
+        # Let the workers ask once more, so they hear that we are done
+        time.sleep(1.)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        for worker in workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.terminate()
+
+    paths = merge_results(coordinator)
+    print(f'{len(coordinator.results)} tasks done, '
+          f'{len(coordinator.failed)} failed')
+    for dataset, path in paths.items():
+        print(f'Results of {dataset} saved to {path}')
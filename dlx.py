@@ -0,0 +1,429 @@
+"""Dancing Links (Algorithm X) exact-cover solver for NxN sudokus
+
+A sudoku is an exact cover problem: every candidate placement (row,
+column, digit) covers one cell, one row-digit, one column-digit and one
+block-digit constraint, and a solution picks placements that cover each
+constraint exactly once. This skips the CNF route through
+`sudoku-rules.txt` and the DPLL `Solver` entirely, which makes it a
+fast path and a throughput baseline for sudoku workloads.
+"""
+
+import argparse
+import math
+import sys
+import time
+from typing import List
+
+from loguru import logger
+
+
+# Digits of grids larger than 9x9 continue with letters (A = 10)
+DIGITS = '123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def parse_grid(line: str, size=9) -> List[List[int]]:
+    """Convert a single line of sudoku data into a grid.
+
+    Parameters
+    ----------
+    line : str
+        The puzzle as a string of `DIGITS` and '.' (or '0') for empty
+        cells, read row by row.
+    size : int, optional
+        The side of the sudoku, by default 9
+
+    Returns
+    -------
+    List[List[int]]
+        The rows of the grid, with 0 for empty cells.
+    """
+
+    line = line.strip()
+    if len(line) < size * size:
+        raise ValueError(f'Expected {size * size} cells, got {len(line)}')
+    values = [0 if char in '.0' else DIGITS.index(char.upper()) + 1
+              for char in line[:size * size]]
+    return [values[r * size:(r + 1) * size] for r in range(size)]
+
+
+class DLXSolver:
+    """Algorithm X over array-backed Dancing Links for NxN sudokus.
+
+    The links of the sparse constraint matrix are kept in flat lists
+    (left, right, up, down, column), so covering and uncovering a
+    column only rewires list entries and never allocates.
+    """
+
+    def __init__(self, sigma: List[List[int]], size=9, max_nodes=None,
+                 backtrack_thresh=None):
+        """Constructor for `DLXSolver` class
+
+        Parameters
+        ----------
+        sigma : List[List[int]]
+            A sudoku in DIMACS encoding. Only its positive unit clauses
+            (the givens, named `int(f'{row}{col}{digit}')`) are read, as
+            the sudoku rules are built into the exact cover problem.
+        size : int, optional
+            The side of the sudoku, by default 9. Must be a square.
+        max_nodes : int, optional
+            The number of placements to try before the solver should
+            timeout, by default None (no limit)
+        backtrack_thresh : int, optional
+            The number of backtracks after which the solver should
+            timeout, by default None (no limit)
+        """
+
+        givens = []
+        for clause in sigma:
+            if len(clause) == 1 and clause[0] > 0:
+                lit = clause[0]
+                givens.append((lit // 100 - 1, lit // 10 % 10 - 1,
+                               lit % 10 - 1))
+        self.__setup(givens, size, max_nodes, backtrack_thresh)
+
+    @classmethod
+    def from_grid(cls, grid: List[List[int]], max_nodes=None,
+                  backtrack_thresh=None):
+        """Build a solver for a grid of any (square) size.
+
+        Parameters
+        ----------
+        grid : List[List[int]]
+            The rows of the sudoku, with 0 for empty cells
+            (see `parse_grid`).
+        max_nodes, backtrack_thresh : int, optional
+            The limits of the search (see `DLXSolver`),
+            by default None (no limit)
+        """
+
+        solver = cls.__new__(cls)
+        givens = [(r, c, value - 1) for r, row in enumerate(grid)
+                  for c, value in enumerate(row) if value]
+        solver.__setup(givens, len(grid), max_nodes, backtrack_thresh)
+        return solver
+
+    def solve(self) -> bool:
+        """Find whether the sudoku has a solution
+
+        Returns
+        -------
+        bool
+            `True` if solvable, else `False`.
+            (Note: will also be `False` in case of timeout.)
+        """
+        steps = self.steps(every=0)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def steps(self, every=1000):
+        """Run the search as a generator that pauses every few placements.
+
+        Parameters
+        ----------
+        every : int, optional
+            The number of placements tried between pauses,
+            by default 1000. A value of 0 never pauses.
+
+        Yields
+        ------
+        dict
+            The current `progress` of the solver.
+        """
+        L, R, U, D, C, S = self.__L, self.__R, self.__U, self.__D, \
+            self.__C, self.__S
+        cover, uncover = self.__cover, self.__uncover
+
+        res = False
+        if self.__conflict:
+            logger.info('UNSAT (conflicting givens)')
+        elif R[0] == 0:
+            res = True
+        else:
+            stack = []
+            c = self.__choose()
+            cover(c)
+            r = D[c]
+            while True:
+                if r == c:
+                    # Every row of column c failed: undo the last choice
+                    uncover(c)
+                    if not stack:
+                        break
+                    r = stack.pop()
+                    c = C[r]
+                    j = L[r]
+                    while j != r:
+                        uncover(C[j])
+                        j = L[j]
+                    r = D[r]
+                    self.__backtracks += 1
+                    if self.backtrack_thresh is not None and \
+                            self.__backtracks > self.backtrack_thresh:
+                        logger.error(f'Timeout after '
+                                     f'{self.backtrack_thresh} backtracks!')
+                        self.__timedout = True
+                        return False
+                    continue
+
+                self.__nodes += 1
+                if every and self.__nodes % every == 0:
+                    yield self.progress
+                if self.__cancelled:
+                    logger.warning('CANCELLED')
+                    return False
+                if self.max_nodes is not None and \
+                        self.__nodes > self.max_nodes:
+                    logger.error(f'Timeout after {self.max_nodes} nodes!')
+                    self.__timedout = True
+                    return False
+
+                stack.append(r)
+                j = R[r]
+                while j != r:
+                    cover(C[j])
+                    j = R[j]
+                if R[0] == 0:
+                    self.__chosen.extend(self.__row[n] for n in stack)
+                    res = True
+                    break
+                c = self.__choose()
+                cover(c)
+                r = D[c]
+
+        if res:
+            self.__fill()
+            logger.warning('SAT')
+            self.__conclusion = 'SAT'
+        else:
+            logger.warning('UNSAT')
+            self.__conclusion = 'UNSAT'
+        return res
+
+    def cancel(self):
+        """Ask a running solver to stop at its next placement."""
+        self.__cancelled = True
+
+    @property
+    def grid(self) -> List[List[int]]:
+        """Returns the grid (with 0 for empty cells) after solving"""
+        size = self.size
+        grid = [[0] * size for _ in range(size)]
+        for r, c, d in self.__chosen:
+            grid[r][c] = d + 1
+        return grid
+
+    @property
+    def performance(self) -> dict:
+        """Returns performance statistics"""
+        return {
+            'heuristic': 'dlx',
+            'calls': self.__nodes,
+            'backtracks': self.__backtracks,
+            'conclusion': 'CANCELLED' if self.__cancelled else (
+                'TIMEOUT' if self.__timedout else self.__conclusion),
+        }
+
+    @property
+    def progress(self) -> dict:
+        """Returns the progress of a running search"""
+        return {
+            'calls': self.__nodes,
+            'backtracks': self.__backtracks,
+            'unknowns': self.unknowns,
+        }
+
+    @property
+    def timedout(self) -> bool:
+        """Whether the solver timed out before reaching a conclusion."""
+        return self.__timedout
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the solver was cancelled before reaching a conclusion."""
+        return self.__cancelled
+
+    @property
+    def unknowns(self) -> int:
+        """Returns a count of the variables with unknown values."""
+        return len([v for v in self.variables if self.variables[v] is None])
+
+    def __setup(self, givens: List, size: int, max_nodes, backtrack_thresh):
+        """Link up the exact cover matrix and place the givens"""
+        block = math.isqrt(size)
+        if block * block != size:
+            raise ValueError('The side of the sudoku must be a square')
+
+        self.size = size
+        self.max_nodes = max_nodes
+        self.backtrack_thresh = backtrack_thresh
+        self.__nodes = 0
+        self.__backtracks = 0
+        self.__timedout = False
+        self.__cancelled = False
+        self.__conclusion = None
+        self.__conflict = False
+        self.__chosen = []
+        # Variables exist in the DIMACS encoding up to 9x9 only
+        self.variables = {}
+        if size <= 9:
+            self.variables = {r * 100 + c * 10 + d: None
+                              for r in range(1, size + 1)
+                              for c in range(1, size + 1)
+                              for d in range(1, size + 1)}
+
+        # Node 0 is the root, nodes 1..n_cols the column headers
+        n_cols = 4 * size * size
+        n_nodes = 1 + n_cols + 4 * size**3
+        L = list(range(-1, n_nodes - 1))
+        R = list(range(1, n_nodes + 1))
+        L[0], R[n_cols] = n_cols, 0
+        U = list(range(n_nodes))
+        D = list(range(n_nodes))
+        C = list(range(n_nodes))
+        S = [0] * (n_cols + 1)
+        self.__row = {}
+        first = {}
+
+        node = n_cols + 1
+        for r in range(size):
+            for c in range(size):
+                b = (r // block) * block + c // block
+                for d in range(size):
+                    columns = [1 + r * size + c,
+                               1 + size * size + r * size + d,
+                               1 + 2 * size * size + c * size + d,
+                               1 + 3 * size * size + b * size + d]
+                    first[r, c, d] = node
+                    for k, col in enumerate(columns):
+                        L[node] = node - 1 if k else node + 3
+                        R[node] = node + 1 if k < 3 else node - 3
+                        U[node], D[node] = U[col], col
+                        D[U[col]] = node
+                        U[col] = node
+                        C[node] = col
+                        S[col] += 1
+                        self.__row[node] = (r, c, d)
+                        node += 1
+
+        self.__L, self.__R, self.__U, self.__D, self.__C, self.__S = \
+            L, R, U, D, C, S
+
+        # Place the givens by covering all the columns of their rows. A
+        # repeated given is placed once, and only different placements
+        # sharing a cell, row, column or block digit are a conflict.
+        covered = set()
+        for r, c, d in dict.fromkeys(givens):
+            if not (0 <= r < size and 0 <= c < size and 0 <= d < size):
+                raise ValueError(f'Given {(r + 1, c + 1, d + 1)} is '
+                                 f'outside a {size}x{size} sudoku')
+            start = first[r, c, d]
+            columns = [C[n] for n in range(start, start + 4)]
+            if covered.intersection(columns):
+                self.__conflict = True
+                return
+            covered.update(columns)
+            for col in columns:
+                self.__cover(col)
+            self.__chosen.append((r, c, d))
+
+    def __choose(self) -> int:
+        """Returns the column with the fewest rows left"""
+        R, S = self.__R, self.__S
+        best, best_size = 0, None
+        c = R[0]
+        while c != 0:
+            if best_size is None or S[c] < best_size:
+                best, best_size = c, S[c]
+                if best_size < 2:
+                    break
+            c = R[c]
+        return best
+
+    def __cover(self, c: int):
+        """Remove column c and every row that intersects it"""
+        L, R, U, D, C, S = self.__L, self.__R, self.__U, self.__D, \
+            self.__C, self.__S
+        L[R[c]] = L[c]
+        R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def __uncover(self, c: int):
+        """Restore column c, exactly reversing `__cover`"""
+        L, R, U, D, C, S = self.__L, self.__R, self.__U, self.__D, \
+            self.__C, self.__S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c
+        R[L[c]] = c
+
+    def __fill(self):
+        """Set the DIMACS variables from the chosen placements"""
+        if not self.variables:
+            return
+        for v in self.variables:
+            self.variables[v] = False
+        for r, c, d in self.__chosen:
+            self.variables[(r + 1) * 100 + (c + 1) * 10 + d + 1] = True
+
+    def __repr__(self):
+        """String formatting for the class
+        """
+        return "<dlx.DLXSolver metrics={}".format({
+            'heuristic': 'dlx',
+            'calls': self.__nodes,
+            'backtracks': self.__backtracks,
+        })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Solve a sudoku data file with Dancing Links.')
+    parser.add_argument('dataset', type=str,
+                        help='A file with one sudoku per line.')
+    parser.add_argument('-N', type=int, default=9,
+                        help='The side of the sudokus. Default 9.')
+    parser.add_argument('-n', type=int, required=False,
+                        help='Only solve the first n sudokus. Default all.')
+    parser.add_argument('-l', type=str, required=False, choices=[
+                        'DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR',
+                        help='The log level to use for stderr.')
+
+    args = parser.parse_args()
+
+    # Configure logging to stderr
+    logger.remove()
+    logger.add(sys.stderr, level=args.l)
+
+    with open(args.dataset, 'r') as infile:
+        lines = [line for line in infile if line.strip()][:args.n]
+
+    solved, nodes = 0, 0
+    start_time = time.time()
+    for line in lines:
+        solver = DLXSolver.from_grid(parse_grid(line, args.N))
+        solved += solver.solve()
+        nodes += solver.performance['calls']
+    elapsed = time.time() - start_time
+
+    print(f'Solved {solved}/{len(lines)} sudokus in {elapsed:.3f} s '
+          f'({len(lines) / max(elapsed, 1e-9):.1f} per second, '
+          f'{nodes} placements tried)')
@@ -0,0 +1,68 @@
+"""Construction of the solver for each engine chosen on the command line"""
+
+from typing import List
+
+from algorithm import Solver
+from heuristics import random_split
+
+
+ENGINES = ['dpll', 'walksat', 'probsat', 'portfolio', 'dlx']
+
+
+def make_solver(sigma: List[List[int]],
+                engine='dpll',
+                split_heuristic=random_split,
+                max_flips=100000,
+                noise=None,
+                restarts=10,
+                seed_phases=False,
+                **kwargs):
+    """Build the solver for an engine chosen on the command line.
+
+    The local search and Dancing Links modules are only imported when
+    their engine is used.
+
+    Parameters
+    ----------
+    sigma : List[List[int]]
+        A PL expression in DIMACS encoding.
+    engine : str, optional
+        'dpll', 'walksat', 'probsat', 'portfolio' (DPLL and probSAT
+        in turns) or 'dlx' (Dancing Links, for sudokus only),
+        by default 'dpll'
+    split_heuristic : function, optional
+        The splitting heuristic of DPLL, by default random_split
+    max_flips, noise, restarts : optional
+        The settings of the local search (see `LocalSearchSolver`).
+    seed_phases : bool, optional
+        Let DPLL try the values of a local search run first,
+        by default False
+    **kwargs
+        Other settings of `Solver`. Its `backtrack_thresh` also
+        applies to the Dancing Links search.
+    """
+
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine}')
+
+    if engine == 'dlx':
+        from dlx import DLXSolver
+        return DLXSolver(sigma,
+                         backtrack_thresh=kwargs.get('backtrack_thresh'))
+
+    if engine == 'dpll' and not seed_phases:
+        return Solver(sigma, split_heuristic=split_heuristic, **kwargs)
+
+    from local_search import LocalSearchSolver, Portfolio, with_phases
+    if engine in ('walksat', 'probsat'):
+        return LocalSearchSolver(sigma, algorithm=engine, noise=noise,
+                                 max_flips=max_flips, restarts=restarts)
+
+    if seed_phases:
+        split_heuristic = with_phases(split_heuristic, LocalSearchSolver(
+            sigma, noise=noise, max_flips=max_flips, restarts=0))
+    solver = Solver(sigma, split_heuristic=split_heuristic, **kwargs)
+    if engine == 'portfolio':
+        return Portfolio([solver, LocalSearchSolver(
+            sigma, noise=noise, max_flips=max_flips, restarts=restarts)])
+    return solver
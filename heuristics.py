@@ -3,9 +3,9 @@
 from typing import List, Tuple
 from random import choice
 from copy import deepcopy as dcopy
-import numpy as np
 from itertools import chain
-from collections import defaultdict
+from collections import defaultdict, Counter
+from simplifications import probe
 
 
 def random_split(sigma: List[List], variables: dict) -> Tuple:
@@ -54,7 +54,7 @@ def moms_split(sigma: List[List], variables: dict) -> Tuple:
     """
 
     # Step 1 : Find Clauses with Minimum Size
-    minsize = np.min([len(c) for c in sigma])
+    minsize = min([len(c) for c in sigma])
     min_clauses = [x for x in sigma if len(x) == minsize]
     min_lits = list(set(list(chain.from_iterable(min_clauses))))
 
@@ -123,3 +123,53 @@ def jeroslow_wang_split(sigma: List[List], variables: dict) -> Tuple:
     val = False if scores[predicate] >= scores[-1 * predicate] else True
 
     return predicate, val
+
+
+def lookahead_split(sigma: List[List], variables: dict, candidates=8) -> Tuple:
+    """ Lookahead heuristic based on unit propagation
+
+    Each of the variables occurring most often in clauses of minimum size
+    is probed with both values. If one value leads to a conflict, the
+    other is returned straight away. Otherwise the variable whose two
+    probes together remove the most clauses is chosen, with the value
+    that removes more.
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS format.
+    variables : dict
+        The literal names and current values as a dictionary.
+    candidates : int, optional
+        The number of variables to probe, by default 8
+
+    Returns
+    -------
+    Tuple
+        The selected `predicate` and the selected `value`
+    """
+
+    minsize = min(len(c) for c in sigma)
+    counts = Counter(abs(lit) for c in sigma if len(c) == minsize for lit in c)
+
+    best_score, predicate, val = -1, None, True
+    for var, _ in counts.most_common(candidates):
+        reductions = {}
+        for value in [True, False]:
+            trial_sigma, _ = probe(sigma, variables, var if value else -var)
+            if [] in trial_sigma:
+                # The other value is forced
+                return var, not value
+            reductions[value] = len(sigma) - len(trial_sigma)
+
+        score = (reductions[True] + 1) * (reductions[False] + 1)
+        if score > best_score:
+            best_score, predicate = score, var
+            val = reductions[True] >= reductions[False]
+
+    return predicate, val
+
+
+# Splitting heuristics in the order of the `-S` command-line option
+SPLIT_HEURISTICS = [random_split, moms_split, jeroslow_wang_split,
+                    lookahead_split]
@@ -0,0 +1,285 @@
+"""Implication graph storage and propagation for binary clauses"""
+
+from collections import defaultdict
+from typing import Callable, Iterable, List, Optional
+
+
+def strongly_connected_components(nodes: Iterable[int],
+                                  successors: Callable) -> List[List[int]]:
+    """Find the strongly connected components of a directed graph.
+
+    This is an iterative version of Tarjan's algorithm, so that long
+    implication chains do not hit the recursion limit.
+
+    Parameters
+    ----------
+    nodes : Iterable[int]
+        The nodes of the graph.
+    successors : Callable
+        A function returning the successors of a node.
+
+    Returns
+    -------
+    List[List[int]]
+        The components, in reverse topological order (sinks first).
+    """
+
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    components = []
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+class ImplicationGraph:
+    """Binary clauses stored as per-literal implication lists.
+
+    The clause `a b` is stored as the implications `-a -> b` and
+    `-b -> a`. At load time, literals in the same strongly connected
+    component are found to be equivalent and replaced by a single
+    representative, and the transitive reduction of the remaining
+    (acyclic) graph is kept.
+    """
+
+    def __init__(self, binaries: List[List[int]]):
+        """Constructor for `ImplicationGraph` class
+
+        Parameters
+        ----------
+        binaries : List[List[int]]
+            The binary clauses of a PL expression in DIMACS encoding.
+        """
+
+        graph = defaultdict(set)
+        for a, b in binaries:
+            if a != -b:
+                graph[-a].add(b)
+                graph[-b].add(a)
+        variables = sorted({abs(lit) for lit in graph} |
+                           {abs(lit) for lits in graph.values() for lit in lits})
+
+        self.unsatisfiable = False
+        self.representative = {}
+        self.equivalences = 0
+        literals = [lit for v in variables for lit in [v, -v]]
+        for component in strongly_connected_components(
+                literals, lambda lit: graph[lit]):
+            rep = min(component, key=abs)
+            for lit in component:
+                self.representative[lit] = rep
+                if lit == -rep:
+                    self.unsatisfiable = True
+            self.equivalences += len(component) - 1
+
+        # Collapse equivalent literals onto their representatives
+        reduced = defaultdict(set)
+        for lit, implied in graph.items():
+            for other in implied:
+                a, b = self.rep(lit), self.rep(other)
+                if a != b:
+                    reduced[a].add(b)
+
+        self.implications = self.__transitive_reduction(reduced)
+        self.variables = sorted({abs(lit) for lit in self.implications})
+
+    def rep(self, lit: int) -> int:
+        """Returns the representative of a literal's equivalence class"""
+        return self.representative.get(lit, lit)
+
+    @property
+    def edges(self) -> int:
+        """Returns the number of stored implications"""
+        return sum(len(implied) for implied in self.implications.values())
+
+    def propagate(self, variables: dict,
+                  literals: Iterable[int]) -> Optional[List[int]]:
+        """Assign everything implied by the `literals` that are `True`.
+
+        Parameters
+        ----------
+        variables : dict
+            The literal names and current values, updated in place.
+        literals : Iterable[int]
+            Literals which have just become `True`.
+
+        Returns
+        -------
+        Optional[List[int]]
+            The literals this made `True`, or `None` if an implied
+            literal is already `False`.
+        """
+
+        queue = list(literals)
+        assigned = []
+        while queue:
+            lit = queue.pop()
+            for implied in self.implications.get(lit, ()):
+                val = variables[abs(implied)]
+                if val is None:
+                    variables[abs(implied)] = implied > 0
+                    queue.append(implied)
+                    assigned.append(implied)
+                elif val != (implied > 0):
+                    return None
+        return assigned
+
+    def residual_clauses(self, variables: dict) -> List[List[int]]:
+        """Returns the binary clauses over unassigned variables.
+
+        After `propagate()`, these are the only clauses that the graph
+        does not yet satisfy.
+        """
+
+        clauses = set()
+        for lit, implied in self.implications.items():
+            if variables[abs(lit)] is not None:
+                continue
+            for other in implied:
+                if variables[abs(other)] is None:
+                    clauses.add(tuple(sorted([-lit, other])))
+        return [list(clause) for clause in sorted(clauses)]
+
+    def solve_residual(self, variables: dict) -> bool:
+        """Assign the unassigned variables of the graph with 2-SAT.
+
+        Parameters
+        ----------
+        variables : dict
+            The literal names and current values, updated in place.
+            Every assignment must already have been propagated.
+
+        Returns
+        -------
+        bool
+            `True` if the residual binary clauses are satisfiable.
+        """
+
+        free = [v for v in self.variables if variables[v] is None]
+        if not free:
+            return True
+
+        def successors(lit):
+            return [other for other in self.implications.get(lit, ())
+                    if variables[abs(other)] is None]
+
+        order = {}
+        literals = [lit for v in free for lit in [v, -v]]
+        components = strongly_connected_components(literals, successors)
+        for i, component in enumerate(components):
+            for lit in component:
+                order[lit] = i
+        if any(order[v] == order[-v] for v in free):
+            return False
+        # Components found earlier are closer to the sinks, so true
+        for v in free:
+            variables[v] = order[v] < order[-v]
+        return True
+
+    def expand(self, variables: dict, complete=False) -> dict:
+        """Give every substituted variable the value of its representative.
+
+        Parameters
+        ----------
+        variables : dict
+            The values of the solved (substituted) expression.
+        complete : bool, optional
+            Set unassigned representatives to `False` first, so that
+            equivalent variables are never left undetermined,
+            by default False
+
+        Returns
+        -------
+        dict
+            A copy of `variables` including the substituted variables.
+        """
+
+        expanded = dict(variables)
+        if complete:
+            for rep in set(self.representative.values()):
+                if expanded[abs(rep)] is None:
+                    expanded[abs(rep)] = False
+        for lit, rep in self.representative.items():
+            if lit > 0 and rep != lit:
+                val = expanded[abs(rep)]
+                expanded[lit] = None if val is None else (val == (rep > 0))
+        return expanded
+
+    @staticmethod
+    def __transitive_reduction(graph: dict) -> dict:
+        """Drop implications that follow from a longer path.
+
+        Parameters
+        ----------
+        graph : dict
+            An acyclic graph, as a lookup of node to successor set.
+
+        Returns
+        -------
+        dict
+            The implication lists of the reduced graph.
+        """
+
+        reachable = {}
+
+        def descendants(node):
+            """Nodes reachable from `node` by a path of length >= 1"""
+            if node in reachable:
+                return reachable[node]
+            found = set()
+            stack = list(graph.get(node, ()))
+            while stack:
+                other = stack.pop()
+                if other in found:
+                    continue
+                found.add(other)
+                if other in reachable:
+                    found |= reachable[other]
+                else:
+                    stack.extend(graph.get(other, ()))
+            reachable[node] = found
+            return found
+
+        reduced = {}
+        for node, implied in graph.items():
+            indirect = set()
+            for other in implied:
+                indirect |= descendants(other)
+            reduced[node] = [other for other in implied
+                             if other not in indirect]
+        return reduced
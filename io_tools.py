@@ -1,7 +1,7 @@
 """Standing IO for sudoku CNF expressions"""
 
 import os
-from typing import List
+from typing import Iterable, Iterator, List
 from pathlib import Path
 
 
@@ -22,17 +22,37 @@ def read_dimacs(fname: str, sep=' ') -> List[List]:
         integer literals).
     """
 
-    ignore_line_chars = ['p', 'c']
-
     if not os.path.exists(fname):
         raise FileNotFoundError
 
     with open(fname, 'r') as infile:
         rules = infile.readlines()
 
+    return parse_dimacs(rules, sep=sep)
+
+
+def parse_dimacs(lines: Iterable[str], sep=' ') -> List[List]:
+    """Parse lines of DIMACS text to list of lists
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        The lines of a DIMACS file.
+    sep : str, optional
+        The separator used between CNF literals, by default ' '
+
+    Returns
+    -------
+    List[List]
+        Sigma—a list of clauses (each of which is a list of
+        integer literals).
+    """
+
+    ignore_line_chars = ['p', 'c']
+
     # Retrieve all data lines that end with '0', split on separator.
     clauses = []
-    for line in rules:
+    for line in lines:
         l = line.strip()
         if len(l) > 1:
             if l[0] not in ignore_line_chars:
@@ -41,6 +61,34 @@ def read_dimacs(fname: str, sep=' ') -> List[List]:
     return clauses
 
 
+def split_dimacs_stream(lines: Iterable[str]) -> Iterator[List[str]]:
+    """Split a stream of concatenated DIMACS files into separate files
+
+    A new file starts at every `p cnf` header line. A stream without
+    headers is a single file.
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        The lines of the stream, such as `sys.stdin`.
+
+    Yields
+    ------
+    List[str]
+        The lines of each file.
+    """
+
+    current = []
+    for line in lines:
+        if line.startswith('p') and any(l.strip() and l[0] not in 'pc'
+                                        for l in current):
+            yield current
+            current = []
+        current.append(line)
+    if any(l.strip() for l in current):
+        yield current
+
+
 def write_dimacs(fname: str, values: dict):
     """Writes assigned values to file in DIMACS style.
 
@@ -53,20 +101,171 @@ def write_dimacs(fname: str, values: dict):
     """
 
     fpath = Path(fname).parents[0]
-    print(fpath)
     if not os.path.exists(fpath):
         os.makedirs(fpath)
 
-    output = ''
+    output = ' '.join(f'{variable}' if value else f'-{variable}'
+                      for variable, value in values.items())
+
+    with open(fname, 'w') as outfile:
+        outfile.write(output + ' ')
+
+
+def format_solution(values: dict) -> str:
+    """Format assigned values as a competition-style `v ... 0` line.
+
+    Parameters
+    ----------
+    values : dict
+        The assigned variable:value lookup dict.
+
+    Returns
+    -------
+    str
+        The signed literals, sorted by variable, as a single line.
+    """
+
+    lits = ' '.join(f'{variable}' if values[variable] else f'-{variable}'
+                    for variable in sorted(values))
+    return f'v {lits} 0\n'
+
+
+class SolutionWriter:
+    """Streams many solutions into a single appendable file.
 
-    for variable, value in values.items():
-        if value is None or value is False:
-            output += f'-{variable} '
+    With `fmt='competition'` each solution is a `v ... 0` text line. With
+    `fmt='bitset'` each solution is packed into one bit per variable
+    (bit `i` is variable `i + 1`) and appended to a binary file, with the
+    offset and size of every record kept in an index at `<fname>.idx`.
+    Bitset files are read back with `read_bitsets()`.
+    """
+
+    INDEX_DTYPE = [('offset', '<u8'), ('n_vars', '<u4')]
+
+    def __init__(self, fname: str, fmt='competition', n_vars=None):
+        """Constructor for `SolutionWriter` class
+
+        Parameters
+        ----------
+        fname : str
+            Path to output file. Existing files are appended to.
+        fmt : str, optional
+            Either 'competition' or 'bitset', by default 'competition'
+        n_vars : int, optional
+            The number of variables in each bitset, by default the largest
+            variable of each solution.
+        """
+
+        if fmt not in ['competition', 'bitset']:
+            raise ValueError(f'Unknown solution format: {fmt}')
+
+        fpath = Path(fname).parents[0]
+        if not os.path.exists(fpath):
+            os.makedirs(fpath)
+
+        self.fmt = fmt
+        self.n_vars = n_vars
+        self.count = 0
+        if fmt == 'competition':
+            self.__outfile = open(fname, 'a')
+            self.__index = None
         else:
-            output += f'{variable} '
+            self.__outfile = open(fname, 'ab')
+            self.__index = open(f'{fname}.idx', 'ab')
 
-    with open(fname, 'w') as outfile:
-        outfile.write(output)
+    def write(self, values: dict):
+        """Append one solution to the file.
+
+        Parameters
+        ----------
+        values : dict
+            The assigned variable:value lookup dict. An empty dict is
+            written as an empty record.
+
+        Raises
+        ------
+        ValueError
+            If a true variable is beyond the `n_vars` of the writer.
+            Nothing is written then.
+        """
+
+        if self.fmt == 'competition':
+            self.__outfile.write(format_solution(values))
+        else:
+            # Only load numpy when bitsets are written
+            import numpy as np
+            n_vars = self.n_vars or max(values, default=0)
+            beyond = [v for v, val in values.items() if val and v > n_vars]
+            if beyond:
+                raise ValueError(f'Variable {max(beyond)} is beyond the '
+                                 f'{n_vars} variables of the bitsets')
+            bits = np.zeros(n_vars, dtype=bool)
+            bits[[v - 1 for v, val in values.items() if val]] = True
+            entry = np.array([(self.__outfile.tell(), n_vars)],
+                             dtype=self.INDEX_DTYPE)
+            self.__outfile.write(np.packbits(bits).tobytes())
+            self.__index.write(entry.tobytes())
+        self.count += 1
+
+    def close(self):
+        """Flush and close the underlying files."""
+        self.__outfile.close()
+        if self.__index is not None:
+            self.__index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_bitsets(fname: str):
+    """Read a bitset file written by `SolutionWriter` into NumPy.
+
+    Parameters
+    ----------
+    fname : str
+        Path of the bitset file. Its index must be at `<fname>.idx`.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array with one row per solution, where column `i` is
+        the value of variable `i + 1`. Shorter solutions are padded
+        with `False`. Records are read at their indexed offsets, so
+        bytes left by an interrupted write are skipped, and records
+        whose data was cut short are dropped.
+    """
+
+    import numpy as np
+
+    if not os.path.exists(fname):
+        raise FileNotFoundError(f'{fname}')
+
+    index = np.fromfile(f'{fname}.idx', dtype=SolutionWriter.INDEX_DTYPE)
+    data = np.fromfile(fname, dtype=np.uint8)
+    # A record is complete if its data ends before the next one starts
+    offsets = index['offset'].astype(np.int64)
+    ends = offsets + (index['n_vars'].astype(np.int64) + 7) // 8
+    complete = ends <= np.append(offsets[1:], len(data))
+    index, offsets = index[complete], offsets[complete]
+    if len(index) < 1:
+        return np.zeros((0, 0), dtype=bool)
+
+    n_vars = index['n_vars']
+    width = int(n_vars.max())
+    if (n_vars == width).all():
+        # Equal-sized records are gathered from their offsets in one go
+        row_bytes = (width + 7) // 8
+        records = data[offsets[:, None] + np.arange(row_bytes)]
+        return np.unpackbits(records, axis=1, count=width).astype(bool)
+
+    solutions = np.zeros((len(index), width), dtype=bool)
+    for i, (offset, n) in enumerate(zip(offsets, n_vars)):
+        record = data[offset:offset + (n + 7) // 8]
+        solutions[i, :n] = np.unpackbits(record, count=n)
+    return solutions
 
 
 def read_sudokus(fname: str, shape=(9, 9)) -> List[List[List]]:
@@ -97,15 +296,31 @@ def read_sudokus(fname: str, shape=(9, 9)) -> List[List[List]]:
     with open(fname, 'r') as infile:
         sudoku_data = infile.readlines()
 
-    sudokus = []
+    return [parse_sudoku(line, shape) for line in sudoku_data]
+
+
+def parse_sudoku(line: str, shape=(9, 9)) -> List[List]:
+    """Convert a single line of sudoku data into DIMACS clauses.
+
+    Parameters
+    ----------
+    line : str
+        The puzzle as a string of digits and '.' for empty cells,
+        read row by row.
+    shape : tuple, optional
+        Shape of the sudoku, by default (9, 9).
+
+    Returns
+    -------
+    List[List]
+        A list of unit clauses, one for each given cell.
+    """
 
-    for line in sudoku_data:
-        dimacs = []
-        for x in range(1, shape[0] + 1):
-            for y in range(1, shape[1] + 1):
-                char = line[(shape[0] * x) + y - (shape[0]+1)]
-                if char != '.':
-                    dimacs.append([int(f'{x}{y}{char}')])
-        sudokus.append(dimacs)
+    dimacs = []
+    for x in range(1, shape[0] + 1):
+        for y in range(1, shape[1] + 1):
+            char = line[(shape[0] * x) + y - (shape[0]+1)]
+            if char != '.':
+                dimacs.append([int(f'{x}{y}{char}')])
 
-    return sudokus
+    return dimacs
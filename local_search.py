@@ -0,0 +1,482 @@
+"""Stochastic local search (WalkSAT/probSAT) for satisfiable expressions
+
+Local search cannot prove that an expression is `UNSAT`, but on large
+satisfiable random instances it usually finds a model long before DPLL
+would. Besides `LocalSearchSolver` itself, this module provides a
+`Portfolio` that runs it side by side with DPLL, and `with_phases()`,
+which lets DPLL take its values from a local search assignment.
+"""
+
+from typing import Callable, List, Union
+
+import numpy as np
+from loguru import logger
+
+
+# The noise of each algorithm: the random walk probability of WalkSAT,
+# and the break exponent `cb` of probSAT (tuned for 3-SAT)
+DEFAULT_NOISE = {'walksat': 0.567, 'probsat': 2.38}
+
+LOCAL_SEARCH_ALGORITHMS = list(DEFAULT_NOISE)
+
+
+class LocalSearchSolver:
+    """Stochastic local search solver with incremental break counts.
+
+    The search starts from a complete assignment and repeatedly flips a
+    variable of a random unsatisfied clause. For every variable, the
+    number of clauses it alone satisfies (its break count) and the number
+    of unsatisfied clauses it occurs in (its make count) are kept in
+    NumPy arrays and updated incrementally on every flip.
+    """
+
+    def __init__(self,
+                 sigma: List[List[int]],
+                 algorithm='probsat',
+                 noise=None,
+                 max_flips=100000,
+                 restarts=10,
+                 phases=None,
+                 seed=None):
+        """Constructor for `LocalSearchSolver` class
+
+        Parameters
+        ----------
+        sigma : List[List[int]]
+            A PL expression in DIMACS encoding.
+        algorithm : str, optional
+            Either 'probsat' or 'walksat', by default 'probsat'
+        noise : float, optional
+            The random walk probability (WalkSAT) or the break exponent
+            (probSAT), by default the `DEFAULT_NOISE` of the algorithm
+        max_flips : int, optional
+            The number of flips before restarting from a new random
+            assignment, by default 100000
+        restarts : int, optional
+            The number of restarts after which the solver should timeout,
+            by default 10
+        phases : dict, optional
+            The values to start the first try from, by default random
+        seed : int, optional
+            Seed of the random number generator, by default None
+        """
+
+        if algorithm not in DEFAULT_NOISE:
+            raise ValueError(f'Unknown local search algorithm {algorithm}, '
+                             f'choose from {LOCAL_SEARCH_ALGORITHMS}')
+
+        self.sigma = sigma
+        self.algorithm = algorithm
+        self.noise = DEFAULT_NOISE[algorithm] if noise is None else noise
+        self.max_flips = max_flips
+        self.restarts = restarts
+        collapsed = list(set([abs(y) for x in sigma for y in x]))
+        self.variables = {k: None for k in collapsed}
+        self.__rng = np.random.default_rng(seed)
+        self.__flips = 0
+        self.__tries = 0
+        self.__best = None
+        self.__best_assign = None
+        self.__timedout = False
+        self.__cancelled = False
+        self.__conclusion = None
+        self.__build(phases or {})
+
+    def solve(self) -> bool:
+        """Search for a model of the embedded PL expression
+
+        Returns
+        -------
+        bool
+            `True` if a model was found, else `False`.
+            (Note: `False` means a timeout, unless there is an empty clause.)
+        """
+        steps = self.steps(every=0)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def steps(self, every=1000):
+        """Run the search as a generator that pauses every few flips.
+
+        Parameters
+        ----------
+        every : int, optional
+            The number of flips between pauses, by default 1000.
+            A value of 0 never pauses.
+
+        Yields
+        ------
+        dict
+            The current `progress` of the solver.
+        """
+        if self.__empty:
+            logger.warning('UNSAT')
+            self.__conclusion = 'UNSAT'
+            return False
+
+        n = len(self.__names)
+        for self.__tries in range(self.restarts + 1):
+            if self.__tries == 0:
+                assign = self.__initial.copy()
+            else:
+                assign = np.append(self.__rng.integers(
+                    0, 2, n, dtype=np.int8), np.int8(-1))
+            self.__reset(assign)
+            for _ in range(self.max_flips):
+                if self.__count < self.__best:
+                    self.__best = self.__count
+                    self.__best_assign = self.__assign.copy()
+                if self.__count == 0:
+                    break
+                if every and self.__flips % every == 0:
+                    yield self.progress
+                if self.__cancelled:
+                    logger.warning('CANCELLED')
+                    return False
+                clause = self.__unsat[self.__rng.integers(self.__count)]
+                self.__flip(self.__pick(clause))
+                self.__flips += 1
+            else:
+                if self.__count < self.__best:
+                    self.__best = self.__count
+                    self.__best_assign = self.__assign.copy()
+                logger.info(f'RESTART after {self.max_flips} flips '
+                            f'({self.__count} clauses unsatisfied)')
+                continue
+
+            self.__best_assign = self.__assign.copy()
+            self.variables = self.phases
+            logger.warning('SAT')
+            self.__conclusion = 'SAT'
+            return True
+
+        logger.error(f'Timeout after {self.restarts} restarts!')
+        self.__timedout = True
+        return False
+
+    def cancel(self):
+        """Ask a running solver to stop at its next flip."""
+        self.__cancelled = True
+
+    @property
+    def phases(self) -> dict:
+        """Returns the best assignment found so far (fewest unsatisfied)"""
+        assign = self.__initial if self.__best_assign is None \
+            else self.__best_assign
+        return {name: bool(assign[i]) for i, name in enumerate(self.__names)}
+
+    @property
+    def performance(self) -> dict:
+        """Returns performance statistics"""
+        return {
+            'heuristic': self.algorithm,
+            'flips': self.__flips,
+            'restarts': self.__tries,
+            'best_unsat': self.__best,
+            'conclusion': 'CANCELLED' if self.__cancelled else (
+                'TIMEOUT' if self.__timedout else self.__conclusion),
+        }
+
+    @property
+    def progress(self) -> dict:
+        """Returns the progress of a running search"""
+        return {
+            'flips': self.__flips,
+            'restarts': self.__tries,
+            'unsat': self.__count,
+            'best_unsat': self.__best,
+        }
+
+    @property
+    def timedout(self) -> bool:
+        """Whether the solver gave up before finding a model."""
+        return self.__timedout
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the solver was cancelled before finding a model."""
+        return self.__cancelled
+
+    @property
+    def unknowns(self) -> int:
+        """Returns a count of the variables with unknown values."""
+        return len([v for v in self.variables if self.variables[v] is None])
+
+    def __build(self, phases: dict):
+        """Index the clauses and the occurrences of every literal
+
+        Variables are numbered 0..n-1 and clauses are stored as rows of
+        a matrix padded with the dummy variable n. Tautologies are
+        dropped, as they can never be unsatisfied.
+        """
+        self.__names = sorted(self.variables)
+        index = {name: i for i, name in enumerate(self.__names)}
+        n = len(self.__names)
+
+        clauses = []
+        for clause in self.sigma:
+            lits = set(clause)
+            if not any(-lit in lits for lit in lits):
+                clauses.append(sorted(lits, key=abs))
+        self.__empty = any(len(clause) == 0 for clause in clauses)
+
+        width = max([len(clause) for clause in clauses] + [1])
+        self.__vars = np.full((len(clauses), width), n, dtype=np.intp)
+        self.__signs = np.zeros((len(clauses), width), dtype=np.int8)
+        occurrences = [[] for _ in range(2 * n)]
+        for c, clause in enumerate(clauses):
+            for j, lit in enumerate(clause):
+                v = index[abs(lit)]
+                self.__vars[c, j] = v
+                self.__signs[c, j] = lit > 0
+                occurrences[2 * v + (lit > 0)].append(c)
+        # The clauses in which variable v being False (True) is a true literal
+        self.__occurrences = [np.array(occ, dtype=np.intp)
+                              for occ in occurrences]
+
+        self.__initial = np.append(self.__rng.integers(
+            0, 2, n, dtype=np.int8), np.int8(-1))
+        for name, val in phases.items():
+            if name in index and val is not None:
+                self.__initial[index[name]] = val
+
+    def __reset(self, assign: np.ndarray):
+        """Compute the counts of a new assignment from scratch"""
+        n, m = len(self.__names), len(self.__vars)
+        self.__assign = assign
+        true = self.__assign[self.__vars] == self.__signs
+        self.__num_true = true.sum(axis=1)
+        # The xor of the true variables is the only true variable of
+        # clauses with a single true literal
+        self.__true_xor = np.bitwise_xor.reduce(
+            np.where(true, self.__vars, 0), axis=1)
+        self.__break = np.zeros(n + 1, dtype=np.int64)
+        self.__make = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(self.__break, self.__true_xor[self.__num_true == 1], 1)
+        unsat = np.flatnonzero(self.__num_true == 0)
+        np.add.at(self.__make, self.__vars[unsat].ravel(), 1)
+
+        self.__unsat = np.zeros(m, dtype=np.intp)
+        self.__where = np.full(m, -1, dtype=np.intp)
+        self.__unsat[:len(unsat)] = unsat
+        self.__where[unsat] = np.arange(len(unsat))
+        self.__count = len(unsat)
+        if self.__best is None:
+            self.__best = self.__count
+
+    def __pick(self, clause: int) -> int:
+        """Choose the variable of an unsatisfied clause to flip"""
+        candidates = self.__vars[clause]
+        candidates = candidates[candidates < len(self.__names)]
+        breaks = self.__break[candidates]
+
+        if self.algorithm == 'probsat':
+            weights = np.cumsum((1. + breaks) ** -self.noise)
+            return int(candidates[np.searchsorted(
+                weights, self.__rng.random() * weights[-1], side='right')])
+
+        # WalkSAT: never break a clause if that can be avoided
+        free = candidates[breaks == 0]
+        if len(free) > 0:
+            return int(free[self.__rng.integers(len(free))])
+        if self.__rng.random() < self.noise:
+            return int(candidates[self.__rng.integers(len(candidates))])
+        best = candidates[breaks == breaks.min()]
+        makes = self.__make[best]
+        best = best[makes == makes.max()]
+        return int(best[self.__rng.integers(len(best))])
+
+    def __flip(self, v: int):
+        """Flip variable `v` and update the counts of its clauses"""
+        val = int(self.__assign[v])
+        self.__assign[v] = 1 - val
+        made_true = self.__occurrences[2 * v + (1 - val)]
+        made_false = self.__occurrences[2 * v + val]
+
+        # Clauses in which the literal of v became true
+        num_true = self.__num_true[made_true]
+        satisfied = made_true[num_true == 0]
+        np.subtract.at(self.__break, self.__true_xor[
+            made_true[num_true == 1]], 1)
+        self.__break[v] += len(satisfied)
+        np.subtract.at(self.__make, self.__vars[satisfied].ravel(), 1)
+        self.__num_true[made_true] += 1
+        self.__true_xor[made_true] ^= v
+        for c in satisfied:
+            i, last = self.__where[c], self.__unsat[self.__count - 1]
+            self.__unsat[i] = last
+            self.__where[last] = i
+            self.__where[c] = -1
+            self.__count -= 1
+
+        # Clauses in which the literal of v became false
+        num_true = self.__num_true[made_false]
+        broken = made_false[num_true == 1]
+        self.__break[v] -= len(broken)
+        np.add.at(self.__make, self.__vars[broken].ravel(), 1)
+        self.__num_true[made_false] -= 1
+        self.__true_xor[made_false] ^= v
+        np.add.at(self.__break, self.__true_xor[
+            made_false[num_true == 2]], 1)
+        for c in broken:
+            self.__unsat[self.__count] = c
+            self.__where[c] = self.__count
+            self.__count += 1
+
+    def __repr__(self):
+        """String formatting for the class
+        """
+        return "<local_search.LocalSearchSolver metrics={}".format({
+            'heuristic': self.algorithm,
+            'flips': self.__flips,
+            'restarts': self.__tries,
+            'best_unsat': self.__best,
+        })
+
+
+class Portfolio:
+    """Solvers for the same expression, run in turns until one concludes.
+
+    A model from any member, or a proof of `UNSAT` from a complete
+    (DPLL) member, ends the search and the other members are cancelled.
+    """
+
+    def __init__(self, members: List, slices=None):
+        """Constructor for `Portfolio` class
+
+        Parameters
+        ----------
+        members : List
+            `Solver` and `LocalSearchSolver` instances that have not
+            been run yet.
+        slices : List[int], optional
+            The number of steps each member runs per turn, by default
+            20 DPLL calls or 500 local search flips
+        """
+
+        if not members:
+            raise ValueError('A portfolio needs at least one member')
+
+        self.members = members
+        self.slices = slices or [
+            500 if isinstance(member, LocalSearchSolver) else 20
+            for member in members]
+        self.winner = None
+        self.variables = members[0].variables
+
+    def solve(self) -> bool:
+        """Find whether the members' expression is `SAT` or `UNSAT`"""
+        steps = self.steps()
+        while True:
+            try:
+                next(steps)
+            except StopIteration as stop:
+                return stop.value
+
+    def steps(self, every=None):
+        """Run the members in turns, yielding after every turn.
+
+        The pause interval of each member is given by `slices`, so
+        `every` is only accepted for compatibility with `Solver.steps`.
+        """
+        running = {i: member.steps(every=size) for i, (member, size)
+                   in enumerate(zip(self.members, self.slices))}
+        while running:
+            for i in list(running):
+                try:
+                    next(running[i])
+                except StopIteration as stop:
+                    del running[i]
+                    member = self.members[i]
+                    if stop.value or not (member.timedout or
+                                          member.cancelled):
+                        self.winner = member
+                        for other in running.values():
+                            other.close()
+                        self.variables = member.variables
+                        logger.info(f'Portfolio won by {member}')
+                        return stop.value
+            yield self.progress
+        return False
+
+    def cancel(self):
+        """Cancel every member."""
+        for member in self.members:
+            member.cancel()
+
+    @property
+    def performance(self) -> dict:
+        """Returns the performance statistics of the winning member"""
+        member = self.winner or self.members[0]
+        perf = dict(member.performance)
+        perf['heuristic'] = '+'.join(m.performance['heuristic']
+                                     for m in self.members)
+        perf['winner'] = None if self.winner is None else \
+            self.winner.performance['heuristic']
+        if self.winner is None:
+            perf['conclusion'] = 'CANCELLED' if self.cancelled else 'TIMEOUT'
+        return perf
+
+    @property
+    def progress(self) -> dict:
+        """Returns the progress of every member"""
+        return {'members': [member.progress for member in self.members]}
+
+    @property
+    def timedout(self) -> bool:
+        """Whether no member reached a conclusion."""
+        return self.winner is None and not self.cancelled
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the portfolio was cancelled before a conclusion."""
+        return self.winner is None and any(m.cancelled for m in self.members)
+
+    def __repr__(self):
+        """String formatting for the class
+        """
+        return "<local_search.Portfolio members={} winner={}>".format(
+            self.members, self.winner)
+
+
+def with_phases(split_heuristic: Callable,
+                phases: Union[dict, LocalSearchSolver]) -> Callable:
+    """Make a splitting heuristic try the values of a given assignment.
+
+    The heuristic still chooses the variable to split on, but its value
+    is taken from `phases` where possible.
+
+    Parameters
+    ----------
+    split_heuristic : Callable
+        A splitting heuristic (see `heuristics.py`).
+    phases : Union[dict, LocalSearchSolver]
+        The values to try first, or a local search solver which is run
+        on the first split to provide them (its best assignment is used
+        even if it found no model).
+
+    Returns
+    -------
+    Callable
+        The seeded splitting heuristic.
+    """
+
+    seeded = None
+
+    def phase_split(sigma: List[List], variables: dict):
+        nonlocal seeded
+        if seeded is None:
+            if isinstance(phases, LocalSearchSolver):
+                phases.solve()
+                seeded = phases.phases
+            else:
+                seeded = phases
+        predicate, val = split_heuristic(sigma, variables)
+        return predicate, seeded.get(predicate, val)
+
+    phase_split.__name__ = f'{split_heuristic.__name__}_phases'
+    return phase_split
+
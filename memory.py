@@ -0,0 +1,121 @@
+"""Low-overhead measurement of the memory used by a single solve"""
+
+import os
+import sys
+import threading
+import tracemalloc
+
+
+MEMORY_MODES = ['rss', 'tracemalloc']
+
+# The result column of the peak of each mode, as the resident set size
+# only gives a lower bound of how much a solve grew the process (see
+# `MemoryMeter`)
+PEAK_COLUMNS = {'rss': 'mem_rss_growth', 'tracemalloc': 'mem_peak'}
+
+
+def _max_rss() -> int:
+    """Returns the peak resident set size of this process in bytes."""
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _rss() -> int:
+    """Returns the resident set size of this process in bytes.
+
+    Falls back to the peak resident set size where `/proc` is missing.
+    """
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return _max_rss()
+
+
+class MemoryMeter:
+    """Context manager recording the peak memory used inside it.
+
+    A background thread samples the resident set size and the number of
+    allocated blocks of the interpreter every `interval` seconds, which
+    costs next to nothing. The resident set size seldom shrinks within
+    a process, so in 'rss' mode `peak` is how much the solve grew the
+    process beyond the largest earlier solve, and is often 0 after a
+    large one; the allocated blocks do not have this problem. When the
+    solve raises the peak resident set size of the process, `peak` is
+    taken from that exact peak; otherwise it is sampled and memory freed
+    again within one `interval` is missed, so it is a lower bound. In
+    'tracemalloc' mode the peak is exact for every solve instead, at
+    the cost of tracing every allocation while inside the meter.
+    """
+
+    def __init__(self, mode='rss', interval=0.01):
+        """Constructor for `MemoryMeter` class
+
+        Parameters
+        ----------
+        mode : str, optional
+            Either 'rss' or 'tracemalloc', by default 'rss'
+        interval : float, optional
+            Seconds between samples, by default 0.01
+        """
+
+        if mode not in MEMORY_MODES:
+            raise ValueError(f'Unknown memory mode {mode}, '
+                             f'choose from {MEMORY_MODES}')
+
+        self.mode = mode
+        self.interval = interval
+        self.peak = 0
+        self.blocks = 0
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__tracing = False
+
+    def __enter__(self):
+        self.peak, self.blocks = 0, 0
+        self.__stop.clear()
+        if self.mode == 'tracemalloc':
+            # Only stop tracing on exit if it was started here
+            self.__tracing = not tracemalloc.is_tracing()
+            if self.__tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.__base, _ = tracemalloc.get_traced_memory()
+        else:
+            self.__base, self.__base_max = _rss(), _max_rss()
+        self.__base_blocks = sys.getallocatedblocks()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.__stop.set()
+        self.__thread.join()
+        self.__record()
+        if self.mode == 'tracemalloc':
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak = peak - self.__base
+            if self.__tracing:
+                tracemalloc.stop()
+        else:
+            # A new process peak is exact, unlike the samples
+            peak = _max_rss()
+            if peak > self.__base_max:
+                self.peak = max(self.peak, peak - self.__base)
+        return False
+
+    def __sample(self):
+        """Record the usage until the meter is left."""
+        while not self.__stop.wait(self.interval):
+            self.__record()
+
+    def __record(self):
+        """Update the peaks with the current usage."""
+        self.blocks = max(self.blocks,
+                          sys.getallocatedblocks() - self.__base_blocks)
+        if self.mode == 'rss':
+            self.peak = max(self.peak, _rss() - self.__base)
@@ -0,0 +1,354 @@
+"""Per-instance selection of the splitting heuristic from formula features"""
+
+import argparse
+import ast
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Callable, List, Tuple
+
+from heuristics import SPLIT_HEURISTICS, jeroslow_wang_split
+from io_tools import read_dimacs
+from loguru import logger
+
+
+FEATURES = ['n_clauses', 'n_vars', 'ratio', 'binary_share', 'unit_share',
+            'mean_length', 'max_length']
+
+# Failed or timed out runs count as this many times their running time
+FAILURE_PENALTY = 10.
+
+DEFAULT_HEURISTIC = jeroslow_wang_split
+
+
+def clause_stats(sigma: List[List]) -> dict:
+    """Count the raw statistics of an expression in a single pass.
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS format.
+
+    Returns
+    -------
+    dict
+        The clause, literal, binary and unit counts, the longest clause
+        length and the set of variables.
+    """
+
+    stats = {'clauses': 0, 'literals': 0, 'binary': 0, 'units': 0,
+             'max_length': 0, 'variables': set()}
+    for clause in sigma:
+        n = len(clause)
+        stats['clauses'] += 1
+        stats['literals'] += n
+        if n == 1:
+            stats['units'] += 1
+        elif n == 2:
+            stats['binary'] += 1
+        if n > stats['max_length']:
+            stats['max_length'] = n
+        stats['variables'].update(abs(lit) for lit in clause)
+    return stats
+
+
+def merge_stats(a: dict, b: dict) -> dict:
+    """Combine the statistics of two expressions joined together."""
+
+    return {
+        'clauses': a['clauses'] + b['clauses'],
+        'literals': a['literals'] + b['literals'],
+        'binary': a['binary'] + b['binary'],
+        'units': a['units'] + b['units'],
+        'max_length': max(a['max_length'], b['max_length']),
+        'variables': a['variables'] | b['variables'],
+    }
+
+
+def formula_features(sigma: List[List], stats=None) -> List[float]:
+    """Compute the cheap selection features of an expression.
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS format.
+    stats : dict, optional
+        Precomputed `clause_stats()` to use instead of `sigma`.
+
+    Returns
+    -------
+    List[float]
+        The values of `FEATURES`, in order.
+    """
+
+    if stats is None:
+        stats = clause_stats(sigma)
+    n_clauses = max(stats['clauses'], 1)
+    n_vars = max(len(stats['variables']), 1)
+
+    return [
+        float(stats['clauses']),
+        float(n_vars),
+        stats['clauses'] / n_vars,
+        stats['binary'] / n_clauses,
+        stats['units'] / n_clauses,
+        stats['literals'] / n_clauses,
+        float(stats['max_length']),
+    ]
+
+
+class HeuristicSelector:
+    """k-nearest-neighbour selector of the fastest splitting heuristic.
+
+    For each heuristic, the running time on a new instance is predicted
+    as the mean log running time of the `k` training instances with the
+    most similar (standardised) features. The heuristic with the lowest
+    prediction is selected.
+    """
+
+    def __init__(self, rows: List[Tuple[List[float], str, float, str]], k=5):
+        """Constructor for `HeuristicSelector` class
+
+        Parameters
+        ----------
+        rows : List[Tuple[List[float], str, float, str]]
+            Training rows of features, heuristic name, running time
+            (penalised for failures) and instance name.
+        k : int, optional
+            The number of neighbours to average over, by default 5
+        """
+
+        import numpy as np
+
+        if len(rows) < 1:
+            raise ValueError('Cannot build a selector without training rows')
+
+        self.rows = rows
+        self.k = k
+        self.heuristics = {h.__name__: h for h in SPLIT_HEURISTICS}
+        features = np.array([r[0] for r in rows], dtype=float)
+        self.__mean = features.mean(axis=0)
+        self.__std = features.std(axis=0)
+        self.__std[self.__std == 0] = 1.
+        self.__X = (features - self.__mean) / self.__std
+        self.__names = np.array([r[1] for r in rows])
+        self.__log_times = np.log(np.array([r[2] for r in rows]) + 1e-6)
+
+    @classmethod
+    def train(cls, csv_paths: List[str], rules_path='sudoku-rules.txt', k=5):
+        """Build a selector from `tester.py` result CSV files.
+
+        Parameters
+        ----------
+        csv_paths : List[str]
+            The result files, containing `heuristic`, `running_time`,
+            `correct` and either `puzzle` or `problem` columns.
+        rules_path : str, optional
+            The rules that `tester.py` added to every instance,
+            by default 'sudoku-rules.txt'
+        k : int, optional
+            The number of neighbours to average over, by default 5
+        """
+
+        import pandas as pd
+
+        rules = clause_stats(read_dimacs(rules_path))
+        features = {}
+        rows = []
+        for path in csv_paths:
+            df = pd.read_csv(path)
+            key = 'puzzle' if 'puzzle' in df.columns else 'problem'
+            for _, row in df.dropna(subset=['running_time']).iterrows():
+                instance = row[key]
+                if instance not in features:
+                    if key == 'puzzle':
+                        sigma = ast.literal_eval(instance)
+                    else:
+                        sigma = read_dimacs(instance)
+                    features[instance] = formula_features(
+                        None, merge_stats(rules, clause_stats(sigma)))
+                running_time = float(row['running_time'])
+                if not row['correct']:
+                    running_time *= FAILURE_PENALTY
+                rows.append((features[instance], row['heuristic'],
+                             running_time, instance))
+        logger.info(f'Training selector on {len(rows)} runs')
+
+        return cls(rows, k=k)
+
+    @classmethod
+    def load(cls, fname: str):
+        """Load a selector saved with `save()`."""
+
+        with open(fname, 'r') as infile:
+            model = json.load(infile)
+        return cls([tuple(r) for r in model['rows']], k=model['k'])
+
+    def save(self, fname: str):
+        """Persist the selector as JSON."""
+
+        with open(fname, 'w') as outfile:
+            json.dump({'k': self.k, 'features': FEATURES,
+                       'rows': [list(r) for r in self.rows]}, outfile)
+
+    def predict(self, features: List[float], exclude=None) -> dict:
+        """Predict the log running time of each heuristic.
+
+        Parameters
+        ----------
+        features : List[float]
+            The values of `FEATURES` for an instance.
+        exclude : np.ndarray, optional
+            Boolean mask of training rows to ignore.
+
+        Returns
+        -------
+        dict
+            Heuristic name to predicted log running time.
+        """
+
+        import numpy as np
+
+        x = (np.asarray(features, dtype=float) - self.__mean) / self.__std
+        distances = ((self.__X - x)**2).sum(axis=1)
+        predictions = {}
+        for name in np.unique(self.__names):
+            mask = self.__names == name
+            if exclude is not None:
+                mask &= ~exclude
+            if not mask.any():
+                continue
+            d = distances[mask]
+            k = min(self.k, len(d))
+            nearest = np.argpartition(d, k - 1)[:k]
+            predictions[str(name)] = float(
+                self.__log_times[mask][nearest].mean())
+        return predictions
+
+    def select(self, sigma: List[List]) -> Callable:
+        """Choose the splitting heuristic for an expression.
+
+        Parameters
+        ----------
+        sigma : List[List]
+            A PL expression in DIMACS format.
+
+        Returns
+        -------
+        Callable
+            The selected splitting heuristic function.
+        """
+
+        predictions = self.predict(formula_features(sigma))
+        predictions = {k: v for k, v in predictions.items()
+                       if k in self.heuristics}
+        if not predictions:
+            return DEFAULT_HEURISTIC
+        return self.heuristics[min(predictions, key=predictions.get)]
+
+    def evaluate(self) -> dict:
+        """Leave-one-instance-out evaluation on the training rows.
+
+        Only instances that were run with more than one heuristic are
+        used, so that the selected heuristic can be compared.
+
+        Returns
+        -------
+        dict
+            The win rate (how often the fastest heuristic is selected),
+            and the total running time of the selected heuristics, of
+            the best single heuristic, and of the per-instance best.
+        """
+
+        import numpy as np
+
+        runs = defaultdict(dict)
+        for features, name, running_time, instance in self.rows:
+            runs[instance][name] = min(running_time,
+                                       runs[instance].get(name, np.inf))
+
+        instances = np.array([r[3] for r in self.rows])
+        wins, selected, oracle, compared = 0, 0., 0., 0
+        single = defaultdict(float)
+        for instance, times in runs.items():
+            if len(times) < 2:
+                continue
+            features = self.rows[int(np.argmax(instances == instance))][0]
+            predictions = self.predict(features,
+                                       exclude=instances == instance)
+            predictions = {k: v for k, v in predictions.items()
+                           if k in times}
+            if not predictions:
+                continue
+            choice = min(predictions, key=predictions.get)
+            best = min(times, key=times.get)
+            compared += 1
+            wins += times[choice] == times[best]
+            selected += times[choice]
+            oracle += times[best]
+            for name, t in times.items():
+                single[name] += t
+
+        return {
+            'instances': compared,
+            'win_rate': wins / compared if compared else None,
+            'selected_time': selected,
+            'best_single_time': min(single.values()) if single else None,
+            'oracle_time': oracle,
+        }
+
+
+def load_selector(fname='selector.json'):
+    """Load a trained selector, or `None` if there is none at `fname`."""
+
+    if not os.path.exists(fname):
+        logger.warning(f'No selector at {fname}, '
+                       f'using {DEFAULT_HEURISTIC.__name__}')
+        return None
+    return HeuristicSelector.load(fname)
+
+
+def select_heuristic(sigma: List[List], selector) -> Tuple[Callable, float]:
+    """Choose a heuristic for `sigma` and time how long it took.
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS format.
+    selector : HeuristicSelector
+        A trained selector, or `None` for the default heuristic.
+
+    Returns
+    -------
+    Tuple[Callable, float]
+        The selected heuristic and the selection time in seconds.
+    """
+
+    start_time = time.time()
+    if selector is None:
+        heuristic = DEFAULT_HEURISTIC
+    else:
+        heuristic = selector.select(sigma)
+    return heuristic, time.time() - start_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Train the heuristic selector on tester.py results.')
+    parser.add_argument('results', type=str, nargs='+',
+                        help='Result CSV files written by tester.py.')
+    parser.add_argument('-o', type=str, default='selector.json',
+                        help='Path to save the selector to. Default selector.json.')
+    parser.add_argument('-k', type=int, default=5,
+                        help='Number of neighbours to average over. Default 5.')
+    parser.add_argument('--rules', type=str, default='sudoku-rules.txt',
+                        help='The rules tester.py added to each instance.')
+
+    args = parser.parse_args()
+
+    selector = HeuristicSelector.train(args.results, rules_path=args.rules,
+                                       k=args.k)
+    selector.save(args.o)
+    print(f'Selector trained on {len(selector.rows)} runs, saved to {args.o}')
+    print(selector.evaluate())
@@ -0,0 +1,384 @@
+"""Long-running solver service with a warm rule base and request batching.
+
+Requests are accepted as JSON, either over local HTTP or over a Unix
+socket (one JSON object per line), and are batched onto a pool of worker
+processes that have already imported the solver and attached to the
+sudoku rules, which are kept once in shared memory. A request is one of:
+
+    {"cnf": [[1, -2], [2, 3]]}           A full CNF expression.
+    {"givens": [[111], [235]]}           Sudoku givens, solved with the rules.
+    {"sudoku": "4.....8.5.3.........."}  A sudoku line, as in the data files.
+
+Optionally with `"S"` (a heuristic number, as in `SAT.py`) and `"backtrack_thresh"`.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from algorithm import Solver, verify_sat
+from heuristics import SPLIT_HEURISTICS
+from io_tools import read_dimacs, parse_sudoku
+from shared_clauses import SharedClauses
+from loguru import logger
+
+
+# The rule base, shared by all worker processes
+_RULES = None
+
+
+def _init_worker(rules_name: str, log_level: str):
+    """Warm up a worker process by attaching to the shared rules."""
+
+    global _RULES
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    _RULES = SharedClauses.attach(rules_name)
+
+
+def _solve_request(request: dict) -> dict:
+    """Solve a single request inside a worker process.
+
+    Parameters
+    ----------
+    request : dict
+        A decoded JSON request (see module docstring).
+
+    Returns
+    -------
+    dict
+        The conclusion, the true literals, and the solver performance.
+    """
+
+    if not isinstance(request, dict):
+        raise ValueError('Request must be a JSON object')
+    try:
+        strategy = int(request.get('S', 1))
+    except (TypeError, ValueError):
+        strategy = None
+    if strategy is None or not 1 <= strategy <= len(SPLIT_HEURISTICS):
+        raise ValueError(f"'S' must be a heuristic number from 1 to "
+                         f"{len(SPLIT_HEURISTICS)}")
+
+    if 'cnf' in request:
+        sigma = [list(clause) for clause in request['cnf']]
+    elif 'givens' in request:
+        sigma = _RULES.overlay([list(clause)
+                                for clause in request['givens']])
+    elif 'sudoku' in request:
+        sigma = _RULES.overlay(parse_sudoku(request['sudoku']))
+    else:
+        raise ValueError("Request needs one of 'cnf', 'givens' or 'sudoku'")
+
+    heuristic = SPLIT_HEURISTICS[strategy - 1]
+    solver = Solver(sigma, split_heuristic=heuristic,
+                    backtrack_thresh=int(request.get('backtrack_thresh', 400)))
+    res = solver.solve()
+    var = solver.variables
+    perf = solver.performance
+
+    return {
+        'conclusion': perf['conclusion'],
+        'satisfiable': bool(res) and not solver.timedout,
+        'verified': bool(res) and verify_sat(sigma, var),
+        'assignment': sorted(k for k, v in var.items() if v is True),
+        'performance': perf,
+    }
+
+
+def _solve_batch(requests: list) -> list:
+    """Solve a batch of requests, isolating failures per request."""
+
+    results = []
+    for request in requests:
+        try:
+            results.append(_solve_request(request))
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+
+class SolverService:
+    """Batches incoming requests onto a pool of warm solver processes.
+    """
+
+    def __init__(self,
+                 rules_path='sudoku-rules.txt',
+                 workers=None,
+                 batch_size=16,
+                 batch_window=0.005,
+                 log_level='WARNING'):
+        """Constructor for `SolverService` class
+
+        Parameters
+        ----------
+        rules_path : str, optional
+            The DIMACS rules used for 'givens' and 'sudoku' requests,
+            by default 'sudoku-rules.txt'
+        workers : int, optional
+            Number of worker processes, by default the CPU count
+        batch_size : int, optional
+            The largest number of requests sent to a worker at once,
+            by default 16
+        batch_window : float, optional
+            Seconds to wait for a batch to fill up, by default 0.005
+        log_level : str, optional
+            The log level used by the workers, by default 'WARNING'
+        """
+
+        if not os.path.exists(rules_path):
+            raise FileNotFoundError(f'{rules_path}')
+
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.__rules = SharedClauses.create(read_dimacs(rules_path))
+        self.__pool = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(self.__rules.name, log_level))
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__latencies = deque(maxlen=10000)
+        self.__counts = {'SAT': 0, 'UNSAT': 0, 'TIMEOUT': 0, 'errors': 0}
+        self.__batches = 0
+        self.__started = time.time()
+        self.__running = True
+        self.__batcher = threading.Thread(target=self.__batch_loop,
+                                          daemon=True)
+        self.__batcher.start()
+
+    def submit(self, request: dict) -> Future:
+        """Queue a request to be solved.
+
+        Parameters
+        ----------
+        request : dict
+            A decoded JSON request (see module docstring).
+
+        Returns
+        -------
+        Future
+            Resolves to the result dictionary of the request.
+        """
+
+        future = Future()
+        self.__queue.put((request, future, time.time()))
+        return future
+
+    def solve(self, request: dict, timeout=None) -> dict:
+        """Queue a request and wait for its result."""
+
+        return self.submit(request).result(timeout=timeout)
+
+    @property
+    def stats(self) -> dict:
+        """Returns throughput and latency statistics"""
+
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+            counts = dict(self.__counts)
+            batches = self.__batches
+
+        uptime = time.time() - self.__started
+        solved = sum(counts.values())
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1,
+                                 int(p / 100 * len(latencies)))]
+
+        return {
+            'uptime': uptime,
+            'solved': solved,
+            'queued': self.__queue.qsize(),
+            'throughput': solved / uptime if uptime > 0 else 0.,
+            'latency_p50': percentile(50),
+            'latency_p99': percentile(99),
+            'batches': batches,
+            'mean_batch_size': solved / batches if batches else 0.,
+            **counts,
+        }
+
+    def shutdown(self):
+        """Stop accepting batches and shut the worker pool down."""
+
+        self.__running = False
+        self.__batcher.join()
+        self.__pool.shutdown()
+        self.__rules.close()
+
+    def __batch_loop(self):
+        """Collect queued requests into batches and dispatch them."""
+
+        while self.__running:
+            try:
+                batch = [self.__queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.__queue.get(
+                        timeout=max(0., deadline - time.time())))
+                except queue.Empty:
+                    break
+
+            requests = [request for request, _, _ in batch]
+            job = self.__pool.submit(_solve_batch, requests)
+            job.add_done_callback(
+                lambda job, batch=batch: self.__complete(job, batch))
+
+    def __complete(self, job: Future, batch: list):
+        """Resolve the futures of a finished batch and record stats."""
+
+        now = time.time()
+        try:
+            results = job.result()
+        except Exception as e:
+            results = [{'error': str(e)}] * len(batch)
+
+        with self.__lock:
+            self.__batches += 1
+            for (_, future, queued), result in zip(batch, results):
+                self.__latencies.append(now - queued)
+                if 'error' in result:
+                    self.__counts['errors'] += 1
+                else:
+                    self.__counts[result['conclusion']] += 1
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+def make_http_handler(service: SolverService):
+    """Build an HTTP request handler bound to `service`.
+
+    `POST /solve` takes a JSON request and `GET /stats` reports the
+    service statistics.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, service.stats)
+            else:
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/solve':
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length))
+            except ValueError as e:
+                self._reply(400, {'error': str(e)})
+                return
+            if not isinstance(request, dict):
+                self._reply(400, {'error': 'Request must be a JSON object'})
+                return
+            result = service.solve(request)
+            self._reply(400 if 'error' in result else 200, result)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def make_unix_handler(service: SolverService):
+    """Build a Unix socket handler bound to `service`.
+
+    Each line received is a JSON request (or `{"op": "stats"}`) and is
+    answered with a single line of JSON.
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('Request must be a JSON object')
+                    if request.get('op') == 'stats':
+                        result = service.stats
+                    else:
+                        result = service.solve(request)
+                except ValueError as e:
+                    result = {'error': str(e)}
+                self.wfile.write(json.dumps(result).encode() + b'\n')
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Long-running SAT solver service for sudoku applications.')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='The host to serve HTTP on. Default 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='The port to serve HTTP on. Default 8080.')
+    parser.add_argument('--socket', type=str, required=False,
+                        help='Serve on this Unix socket path instead of HTTP.')
+    parser.add_argument('--rules', type=str, default='sudoku-rules.txt',
+                        help='The DIMACS rules used for sudoku requests.')
+    parser.add_argument('-j', type=int, required=False,
+                        help='Number of worker processes. Default CPU count.')
+    parser.add_argument('--batch', type=int, default=16,
+                        help='Maximum requests per batch. Default 16.')
+    parser.add_argument('--window', type=float, default=5.,
+                        help='Milliseconds to wait for a batch to fill. Default 5.')
+    parser.add_argument('-l', type=str, required=False, choices=[
+                        'DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR',
+                        help='The log level to use for stderr.')
+
+    args = parser.parse_args()
+
+    # Configure logging to stderr
+    logger.remove()
+    logger.add(sys.stderr, level=args.l)
+
+    service = SolverService(args.rules, workers=args.j,
+                            batch_size=args.batch,
+                            batch_window=args.window / 1000,
+                            log_level=args.l)
+
+    if args.socket is not None:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = socketserver.ThreadingUnixStreamServer(
+            args.socket, make_unix_handler(service))
+        print(f'Serving on unix socket {args.socket}')
+    else:
+        server = ThreadingHTTPServer((args.host, args.port),
+                                     make_http_handler(service))
+        print(f'Serving on http://{args.host}:{args.port}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
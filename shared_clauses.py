@@ -0,0 +1,155 @@
+"""Read-only clause base in shared memory, for use by many processes.
+
+The clauses are stored flat in a `multiprocessing.shared_memory` block
+(Python 3.8+), so that every worker process reads the same physical
+memory instead of parsing and holding its own copy of the rules. The
+per-solve clauses, such as sudoku givens, are layered on top with
+`overlay()`.
+"""
+
+from array import array
+from collections.abc import Sequence
+from multiprocessing import shared_memory
+from typing import List
+
+
+class SharedClauses(Sequence):
+    """A sequence of clauses backed by a shared memory block.
+
+    The block holds the number of clauses, the offset of every clause
+    and then all literals, as native integers.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner=False):
+        """Constructor for `SharedClauses` class (see `create`, `attach`)
+
+        Parameters
+        ----------
+        shm : shared_memory.SharedMemory
+            The block holding the clauses.
+        owner : bool, optional
+            Whether this process created the block, by default False
+        """
+
+        self.__shm = shm
+        self.owner = owner
+        header = shm.buf[:8].cast('q')
+        n_clauses = header[0]
+        header.release()
+        offsets_end = 8 * (n_clauses + 2)
+        self.__offsets = shm.buf[8:offsets_end].cast('q')
+        n_lits = self.__offsets[n_clauses]
+        self.__lits = shm.buf[offsets_end:offsets_end + 4 * n_lits].cast('i')
+        self.__len = n_clauses
+
+    @classmethod
+    def create(cls, sigma: List[List[int]]):
+        """Copy an expression into a new shared memory block.
+
+        Parameters
+        ----------
+        sigma : List[List[int]]
+            A PL expression in DIMACS encoding.
+        """
+
+        offsets = array('q', [len(sigma)])
+        lits = array('i')
+        for clause in sigma:
+            offsets.append(len(lits))
+            lits.extend(clause)
+        offsets.append(len(lits))
+
+        data = offsets.tobytes() + lits.tobytes()
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        """Attach to a block created by another process.
+
+        Parameters
+        ----------
+        name : str
+            The `name` of the `SharedClauses` that created the block.
+        """
+
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching also registers the block for
+            # removal when this process exits, which the owner handles
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm)
+
+    @property
+    def name(self) -> str:
+        """Returns the name other processes attach with"""
+        return self.__shm.name
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.__len))]
+        if i < 0:
+            i += self.__len
+        if not 0 <= i < self.__len:
+            raise IndexError('clause index out of range')
+        return self.__lits[self.__offsets[i]:self.__offsets[i + 1]].tolist()
+
+    def __iter__(self):
+        lits, offsets = self.__lits, self.__offsets
+        for i in range(self.__len):
+            yield lits[offsets[i]:offsets[i + 1]].tolist()
+
+    def overlay(self, clauses: List[List[int]]):
+        """Returns the shared clauses followed by private `clauses`."""
+        return ClauseOverlay(self, clauses)
+
+    def close(self):
+        """Detach from the block, and remove it if this process owns it."""
+        self.__offsets.release()
+        self.__lits.release()
+        self.__shm.close()
+        if self.owner:
+            self.__shm.unlink()
+
+
+class ClauseOverlay(Sequence):
+    """A shared clause base extended with clauses private to one solve.
+    """
+
+    def __init__(self, base: Sequence, clauses: List[List[int]]):
+        """Constructor for `ClauseOverlay` class
+
+        Parameters
+        ----------
+        base : Sequence
+            The shared, read-only clauses.
+        clauses : List[List[int]]
+            The additional clauses.
+        """
+
+        self.base = base
+        self.clauses = clauses
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.clauses)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < len(self.base):
+            return self.base[i]
+        return self.clauses[i - len(self.base)]
+
+    def __iter__(self):
+        yield from self.base
+        yield from self.clauses
@@ -2,6 +2,7 @@
 
 from typing import List, Tuple
 from itertools import chain
+from collections import Counter
 
 
 def tautology(sigma: List[List]) -> List[List]:
@@ -19,17 +20,21 @@ def tautology(sigma: List[List]) -> List[List]:
     -------
     List[List]
         A nested list of `int` or `bool` literals similar to `sigma`
+
+    Examples
+    --------
+    Tautological clauses are always true, so they are dropped entirely:
+
+    >>> tautology([[1, -1], [2, 3], [4, -4, 5]])
+    [[2, 3]]
     """
     new_sigma = []
     for clause in sigma:
-        new_clause = clause
-        for literal in clause:
-            neg_lit = -1 * literal
-            if neg_lit in clause:
-                new_clause.remove(literal)
-                new_clause.remove(neg_lit)
+        # `sigma` may be shared, so clauses are never modified in place
+        if any(-1 * literal in clause for literal in clause):
+            continue
         if len(clause) > 0:
-            new_sigma.append(new_clause)
+            new_sigma.append(clause)
     return new_sigma
 
 
@@ -105,3 +110,130 @@ def pure_literals(sigma: List[List], variables: dict) -> Tuple:
             variables[abs(p)] = new_val
 
     return sigma, variables
+
+
+def assign_values(sigma: List[List], values: dict) -> List[List]:
+    """Fill the values into the expression and simplify
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression to assign values to and simplify.
+    values : dict
+        A dictionary lookup of the literal name and the value to
+        use during assignment.
+
+    Returns
+    -------
+    List[List]
+        A nested list of `int` literals similar to `sigma`, without the
+        satisfied clauses and the falsified literals.
+    """
+
+    new_sigma = []
+    for clause in sigma:
+        new_clause = []
+        satisfied = False
+        for lit in clause:
+            val = values[abs(lit)]
+            if val is None:
+                new_clause.append(lit)
+            elif val == (lit > 0):
+                satisfied = True
+                break
+        if not satisfied:
+            new_sigma.append(new_clause)
+
+    return new_sigma
+
+
+def unit_propagate(sigma: List[List], variables: dict) -> Tuple:
+    """Assigns unit clauses until none are left or a conflict arises
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS encoding, with values already assigned.
+    variables : dict
+        A dictionary lookup of the literal name and the value.
+
+    Returns
+    -------
+    Tuple
+        The simplified expression (containing `[]` on a conflict)
+        and the updated `variables` dictionary.
+    """
+
+    while [] not in sigma and any(len(clause) == 1 for clause in sigma):
+        sigma, variables = unit_clause(sigma, variables)
+        sigma = assign_values(sigma, variables)
+    return sigma, variables
+
+
+def probe(sigma: List[List], variables: dict, literal: int) -> Tuple:
+    """Propagates the consequences of setting `literal` to `True`
+
+    Neither `sigma` nor `variables` is modified.
+
+    Returns
+    -------
+    Tuple
+        The simplified expression (containing `[]` if the literal
+        failed) and the resulting copy of `variables`.
+    """
+
+    trial = dict(variables)
+    trial[abs(literal)] = literal > 0
+    return unit_propagate(assign_values(sigma, trial), trial)
+
+
+def failed_literals(sigma: List[List], variables: dict, budget=20) -> Tuple:
+    """Assigns the opposite value of literals that fail when probed
+
+    A literal fails if unit propagation after setting it to `True` leads
+    to an empty clause, so its negation is implied by the expression.
+    The variables occurring most often in the shortest clauses are
+    probed first.
+
+    Parameters
+    ----------
+    sigma : List[List]
+        A PL expression in DIMACS encoding, with values already assigned.
+    variables : dict
+        A dictionary lookup of the literal name and the value.
+    budget : int, optional
+        The maximum number of literals to probe, by default 20
+
+    Returns
+    -------
+    Tuple
+        The simplified expression, the updated `variables` dictionary
+        and the number of literals forced by probing.
+    """
+
+    if len(sigma) < 1 or [] in sigma:
+        return sigma, variables, 0
+
+    minsize = min(len(c) for c in sigma)
+    counts = Counter(abs(lit) for c in sigma if len(c) == minsize for lit in c)
+    candidates = [v for v, _ in counts.most_common()]
+
+    forced = 0
+    probes = 0
+    for var in candidates:
+        for literal in [var, -var]:
+            if probes >= budget or variables[var] is not None:
+                break
+            probes += 1
+            trial_sigma, _ = probe(sigma, variables, literal)
+            if [] in trial_sigma:
+                forced += 1
+                variables[var] = literal < 0
+                sigma, variables = unit_propagate(
+                    assign_values(sigma, variables), variables)
+                if [] in sigma:
+                    return sigma, variables, forced
+        if probes >= budget:
+            break
+
+    return sigma, variables, forced
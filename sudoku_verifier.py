@@ -1,12 +1,14 @@
 """Verifies that it's a valid sudoku and depicts"""
 
-import numpy as np
+from algorithm import Solver
 
 
 def is_valid(variables, sudoku_sigma, shape=(9, 9)):
     """Verifies that variable state is a valid solution to given sudoku
     """
 
+    import numpy as np
+
     if shape[0] != shape[1]:
         raise ValueError('Only square sudokus supported')
 
@@ -46,7 +48,24 @@ def is_valid(variables, sudoku_sigma, shape=(9, 9)):
 def build_grid(variables, shape=(9,9)):
     """Builds a visual representation of the sudoku solution"""
 
+    import numpy as np
+
     truths = [x for x in variables if variables[x] is True]
     grid = np.array([x % 10 for x in sorted(truths)]).reshape(shape)
 
     return grid
+
+
+def is_unique(sudoku_sigma, rules, **kwargs):
+    """Verifies that a sudoku has exactly one solution
+
+    The solver stops as soon as a second solution is found. Keyword
+    arguments are passed on to the `Solver`.
+    """
+
+    solver = Solver(rules + sudoku_sigma, **kwargs)
+    solver.enumerate(max_models=2)
+    if solver.timedout:
+        raise TimeoutError('Solver timed out before the search completed')
+
+    return solver.model_count == 1
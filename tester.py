@@ -1,11 +1,14 @@
 """Simple testing kit to verify if solver works correctly"""
 
 from tqdm import tqdm
-from copy import deepcopy as dcopy
 from sudoku_verifier import is_valid
-from algorithm import Solver, verify_sat
-from heuristics import random_split, moms_split, jeroslow_wang_split
-from io_tools import read_sudokus, read_dimacs
+from algorithm import verify_sat
+from heuristics import SPLIT_HEURISTICS
+from io_tools import read_sudokus, read_dimacs, SolutionWriter
+from engines import make_solver
+from memory import MemoryMeter, MEMORY_MODES, PEAK_COLUMNS
+from cache import CachedSolver, ResultCache
+from selector import load_selector, select_heuristic
 from loguru import logger
 import pandas as pd
 import os
@@ -15,14 +18,24 @@ import ast
 import time
 from pathlib import Path
 import argparse
+from contextlib import nullcontext
 
 
 LOGDIR = 'logs/'
 CACHE = 'checkpoints/'
 
 
-def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None, **kwargs):
+def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None, writer=None, selector=None, memory=None, result_cache=None, **kwargs):
     """Tests the SAT Solver on sudokus in a DataFrame
+
+    Solutions are streamed to `writer` (a `SolutionWriter`) if given.
+    If `split_heuristic` is `None`, it is chosen per instance by
+    `selector` (see `selector.py`). If `memory` is 'rss' or
+    'tracemalloc', the peak memory and allocated blocks of building and
+    running each solver are recorded (see `memory.py`; in 'rss' mode
+    the peak is a lower bound of the growth of the process, as
+    `mem_rss_growth`). Results are
+    looked up in and added to `result_cache` (a `ResultCache`) if given.
     """
 
     if not isinstance(dataset, pd.DataFrame):
@@ -50,15 +63,29 @@ def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None,
     for i, s in enumerate(tqdm(sudokus)):
         perf = {'puzzle': s, 'correct': False}
         try:
-            sigma = dcopy(rules)
-            sigma.extend(s)
-            orig_sigma = dcopy(sigma)
-            solver = Solver(sigma, split_heuristic=split_heuristic, **kwargs)
-            start_time = time.time()
-            res = solver.solve()
-            solve_time = time.time() - start_time
+            # The solver never modifies clauses, so the rules are shared
+            sigma = rules + s
+            orig_sigma = sigma
+            heuristic, selection_time = split_heuristic, 0.
+            if heuristic is None:
+                heuristic, selection_time = select_heuristic(sigma, selector)
+            meter = nullcontext() if memory is None else MemoryMeter(memory)
+            with meter:
+                if result_cache is None:
+                    solver = make_solver(sigma, split_heuristic=heuristic, **kwargs)
+                else:
+                    solver = CachedSolver(result_cache, sigma, lambda: make_solver(
+                        sigma, split_heuristic=heuristic, **kwargs),
+                        sudoku=True, config=repr(sorted(kwargs.items())))
+                start_time = time.time()
+                res = solver.solve()
+                solve_time = time.time() - start_time
             var = solver.variables
             perf = solver.performance
+            perf['selection_time'] = selection_time
+            if memory is not None:
+                perf[PEAK_COLUMNS[memory]] = meter.peak
+                perf['mem_blocks'] = meter.blocks
             perf['puzzle'] = s
             perf['running_time'] = solve_time
 
@@ -73,6 +100,8 @@ def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None,
             else:
                 failcount += 1
                 perf['correct'] = False
+            if writer is not None and res and not solver.timedout:
+                writer.write(var)
             logger.warning(solver)
         except Exception as e:
             logger.error(e)
@@ -86,7 +115,7 @@ def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None,
             try:
                 # Persist the results (so far) to disk
                 now = datetime.now().strftime('%m-%d-%H_%M_%S')
-                cache_name = f"{cache}/{now}_{split_heuristic.__name__}.csv"
+                cache_name = f"{cache}/{now}_{getattr(split_heuristic, '__name__', 'auto')}.csv"
                 pd.DataFrame(stats).to_csv(cache_name)
                 logger.warning(f'Latest cache: {cache_name}')
             except Exception as e:
@@ -97,8 +126,17 @@ def test_solver(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None,
     return pd.DataFrame(stats)
 
 
-def test_solver_general(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None, **kwargs):
+def test_solver_general(dataset: pd.DataFrame, split_heuristic, sample=None, cache=None, writer=None, selector=None, memory=None, result_cache=None, **kwargs):
     """Tests the SAT Solver on general CNF files listed in a DataFrame
+
+    Solutions are streamed to `writer` (a `SolutionWriter`) if given.
+    If `split_heuristic` is `None`, it is chosen per instance by
+    `selector` (see `selector.py`). If `memory` is 'rss' or
+    'tracemalloc', the peak memory and allocated blocks of building and
+    running each solver are recorded (see `memory.py`; in 'rss' mode
+    the peak is a lower bound of the growth of the process, as
+    `mem_rss_growth`). Results are
+    looked up in and added to `result_cache` (a `ResultCache`) if given.
     """
 
     if not isinstance(dataset, pd.DataFrame):
@@ -132,15 +170,29 @@ def test_solver_general(dataset: pd.DataFrame, split_heuristic, sample=None, cac
 
         perf = {'problem': file, 'correct': False}
         try:
-            sigma = dcopy(rules)
-            sigma.extend(s)
-            orig_sigma = dcopy(sigma)
-            solver = Solver(sigma, split_heuristic=split_heuristic, **kwargs)
-            start_time = time.time()
-            res = solver.solve()
-            solve_time = time.time() - start_time
+            # The solver never modifies clauses, so the rules are shared
+            sigma = rules + s
+            orig_sigma = sigma
+            heuristic, selection_time = split_heuristic, 0.
+            if heuristic is None:
+                heuristic, selection_time = select_heuristic(sigma, selector)
+            meter = nullcontext() if memory is None else MemoryMeter(memory)
+            with meter:
+                if result_cache is None:
+                    solver = make_solver(sigma, split_heuristic=heuristic, **kwargs)
+                else:
+                    solver = CachedSolver(result_cache, sigma, lambda: make_solver(
+                        sigma, split_heuristic=heuristic, **kwargs),
+                        sudoku=False, config=repr(sorted(kwargs.items())))
+                start_time = time.time()
+                res = solver.solve()
+                solve_time = time.time() - start_time
             var = solver.variables
             perf = solver.performance
+            perf['selection_time'] = selection_time
+            if memory is not None:
+                perf[PEAK_COLUMNS[memory]] = meter.peak
+                perf['mem_blocks'] = meter.blocks
             perf['problem'] = file
             perf['running_time'] = solve_time
 
@@ -155,6 +207,8 @@ def test_solver_general(dataset: pd.DataFrame, split_heuristic, sample=None, cac
             else:
                 failcount += 1
                 perf['correct'] = False
+            if writer is not None and res and not solver.timedout:
+                writer.write(var)
             logger.warning(solver)
         except Exception as e:
             logger.error(e)
@@ -168,7 +222,7 @@ def test_solver_general(dataset: pd.DataFrame, split_heuristic, sample=None, cac
             try:
                 # Persist the results (so far) to disk
                 now = datetime.now().strftime('%m-%d-%H_%M_%S')
-                cache_name = f"{cache}/{now}_{split_heuristic.__name__}.csv"
+                cache_name = f"{cache}/{now}_{getattr(split_heuristic, '__name__', 'auto')}.csv"
                 pd.DataFrame(stats).to_csv(cache_name)
                 logger.warning(f'Latest cache: {cache_name}')
             except Exception as e:
@@ -185,9 +239,12 @@ if __name__ == '__main__':
         description='Testing system for SAT solver applied to sudoku.')
     parser.add_argument('dataset', type=str)
     parser.add_argument('-S', type=int,
-                        required=False, choices=[1, 2, 3], default=1,
+                        required=False, choices=[0, 1, 2, 3, 4], default=1,
                         help='Specify which heuristic strategy to use. \
-                            (1) Random, (2) MOMs, (3) 2-sided JW.')
+                            (0) Automatic, (1) Random, (2) MOMs, (3) 2-sided JW, (4) Lookahead.')
+    parser.add_argument('--selector', type=str, default='selector.json',
+                        help='The trained selector used by -S0. \
+                            Default selector.json.')
     parser.add_argument('-n', type=int, required=False,
                         help='The size of the sample to take from the dataset. Default NONE (use all).')
 
@@ -199,9 +256,58 @@ if __name__ == '__main__':
     parser.add_argument('-b', type=int, required=False, default=400,
                         help='Specify after how many backtracks the \
                             solver should timeout. Default 400.')
+    parser.add_argument('-p', type=int, required=False, default=0,
+                        help='Probe this many literals for failure at the \
+                            root of the search. Default 0 (no probing).')
+    parser.add_argument('--binary', default=False, action='store_true',
+                        help='Propagate binary clauses through an implication \
+                            graph instead of treating them as general clauses.')
+    parser.add_argument('--amo', default=False, action='store_true',
+                        help='Detect pairwise at-most-one encodings and use \
+                            native cardinality constraints for them.')
+    parser.add_argument('--components', default=False, action='store_true',
+                        help='Solve the independent parts of the expression \
+                            separately, caching solved parts.')
+    parser.add_argument('--engine', type=str, default='dpll',
+                        choices=['dpll', 'walksat', 'probsat', 'portfolio',
+                                 'dlx'],
+                        help='Solve with DPLL, with local search (which cannot \
+                            prove UNSAT), with DPLL and probSAT in turns, or \
+                            (sudokus only) with Dancing Links. Default dpll.')
+    parser.add_argument('--flips', type=int, default=100000,
+                        help='Local search flips before each restart. \
+                            Default 100000.')
+    parser.add_argument('--restarts', type=int, default=10,
+                        help='Local search restarts before it should timeout. \
+                            Default 10.')
+    parser.add_argument('--noise', type=float, required=False,
+                        help='Local search noise: the walk probability of \
+                            WalkSAT or the break exponent of probSAT.')
+    parser.add_argument('--phases', default=False, action='store_true',
+                        help='Let DPLL first try the values of a local \
+                            search run.')
+    parser.add_argument('--memory', type=str, required=False,
+                        choices=MEMORY_MODES,
+                        help='Record the peak memory and allocated blocks of \
+                            each solve, by sampling the resident set size \
+                            (a lower bound of the growth of the process) or \
+                            exactly with tracemalloc (slower).')
+    parser.add_argument('--result-cache', type=str, required=False,
+                        help='A sqlite file of solved instances to answer \
+                            repeated (and symmetric sudoku) instances from, \
+                            created if missing.')
+    parser.add_argument('--solutions', type=str, required=False,
+                        help='Append every solution found to this file.')
+    parser.add_argument('--solution-format', type=str, required=False,
+                        choices=['competition', 'bitset'], default='bitset',
+                        help='Write solutions as `v ... 0` lines or as packed \
+                            bitsets with an index. Default bitset.')
 
     args = parser.parse_args()
 
+    if args.general and args.engine == 'dlx':
+        parser.error('The dlx engine only solves sudokus')
+
     # Configure logging to stderr
     logger.remove()
     logger.add(sys.stderr, level=args.l)
@@ -212,22 +318,71 @@ if __name__ == '__main__':
     logger.add("logs/{time}.log", level="DEBUG")
 
     # Assign the corresponding splitting heuristic
-    heuristic = [random_split, moms_split,
-                 jeroslow_wang_split][args.S - 1]
-    print(f'Using {heuristic.__name__} heuristic')
+    selector = None
+    if args.S == 0:
+        heuristic = None
+        selector = load_selector(args.selector)
+        print('Using automatic heuristic selection')
+    else:
+        heuristic = SPLIT_HEURISTICS[args.S - 1]
+        print(f'Using {heuristic.__name__} heuristic')
 
     fname = args.dataset
     dataset = pd.read_csv(fname)
 
-    # Run the tests
-    if args.general:
-        df = test_solver_general(
-            dataset, heuristic, sample=args.n, cache=CACHE, backtrack_thresh=args.b)
-    else:
-        df = test_solver(dataset, heuristic, sample=args.n,
-                         cache=CACHE, backtrack_thresh=args.b)
+    writer = None
+    if args.solutions is not None:
+        writer = SolutionWriter(args.solutions, fmt=args.solution_format)
+
+    result_cache = None
+    if args.result_cache is not None:
+        result_cache = ResultCache(args.result_cache)
+
+    # Run the tests, keeping the solutions written so far on errors
+    try:
+        if args.general:
+            df = test_solver_general(
+                dataset, heuristic, sample=args.n, cache=CACHE, writer=writer,
+                selector=selector, backtrack_thresh=args.b, probe_budget=args.p,
+                binary_graph=args.binary, native_amo=args.amo,
+                components=args.components, engine=args.engine,
+                max_flips=args.flips, restarts=args.restarts, noise=args.noise,
+                seed_phases=args.phases, memory=args.memory,
+                result_cache=result_cache)
+        else:
+            df = test_solver(dataset, heuristic, sample=args.n,
+                             cache=CACHE, writer=writer, selector=selector,
+                             backtrack_thresh=args.b, probe_budget=args.p,
+                             binary_graph=args.binary, native_amo=args.amo,
+                             components=args.components, engine=args.engine,
+                             max_flips=args.flips, restarts=args.restarts,
+                             noise=args.noise, seed_phases=args.phases,
+                             memory=args.memory, result_cache=result_cache)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is not None:
+        print(f'{writer.count} solutions written to {args.solutions}')
     print(df.describe())
 
+    if result_cache is not None:
+        print(f'Result cache: {result_cache.hits} hits, '
+              f'{result_cache.misses} misses, {len(result_cache)} stored')
+        result_cache.close()
+
+    if args.memory is not None and 'mem_blocks' in df.columns:
+        key = 'problem' if args.general else 'puzzle'
+        peak = PEAK_COLUMNS[args.memory]
+        # The growth of the resident set size does not rank single solves
+        rank = 'mem_peak' if args.memory == 'tracemalloc' else 'mem_blocks'
+        worst = df.nlargest(5, rank)
+        print(f'Worst instances by {rank}:')
+        for _, row in worst.iterrows():
+            print(f"  {row[peak] / 2**20:8.2f} MiB "
+                  f"{int(row['mem_blocks']):9d} blocks "
+                  f"{row['running_time']:7.3f} s  {str(row[key])[:60]}")
+
     # Save results to custom csv file
     now = datetime.now().strftime("%m-%d-%H_%M_%S")
     path = f'results/{fname}'